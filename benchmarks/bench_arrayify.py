@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Throughput of arrayification: regular expression post-processing
+versus printing array elements directly (``arrayify_mode='printer'``).
+
+Usage::
+
+    $ python3 bench_arrayify.py [number of expressions]
+
+"""
+
+import random
+import sys
+import time
+
+import sympy
+
+from pycodeexport.codeexport import C_Code, DummyGroup, ArrayifyGroup
+
+
+class BenchCode(C_Code):
+    pass
+
+
+def mk_exprs(n, nsymbs=100, seed=42):
+    rnd = random.Random(seed)
+    x = sympy.symbols('x:{}'.format(nsymbs))
+    p = sympy.symbols('p:10')
+    exprs = []
+    for _ in range(n):
+        a, b, c = rnd.sample(x, 3)
+        k = rnd.choice(p)
+        exprs.append(k*a*b - sympy.exp(c/k) + a**2)
+    return exprs, [DummyGroup('xdummy', x), DummyGroup('pdummy', p)], [
+        ArrayifyGroup('xdummy', 'y', 'offset'), ArrayifyGroup('pdummy', 'params')]
+
+
+def main(n=10000):
+    exprs, dg, ag = mk_exprs(n)
+    code = BenchCode(tempdir=None)
+    for mode, kw in [('regex', {}), ('regex (dummify=False)', {'dummify': False}),
+                     ('printer', {'arrayify_mode': 'printer'})]:
+        t0 = time.perf_counter()
+        for expr in exprs:
+            code.as_arrayified_code(expr, dg, ag, **kw)
+        dt = time.perf_counter() - t0
+        print('{:>24}: {:8.0f} expressions/s'.format(mode, n/dt))
+    for mode in ('regex', 'printer'):
+        t0 = time.perf_counter()
+        code.get_cse_code(exprs, dummy_groups=dg, arrayify_groups=ag,
+                          arrayify_mode=mode)
+        dt = time.perf_counter() - t0
+        print('{:>24}: {:8.3f} s (get_cse_code: {})'.format(
+            mode, dt, ', '.join('{}={:.3f}'.format(k, v) for k, v
+                                in code.cse_timings.items())))
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Per-call overhead of the loops example for tiny inputs: the output
+layout lowered at construction (``ExampleCode._output_plan``) versus
+evaluating the output extents with SymPy on every call.
+
+Usage::
+
+    $ python3 bench_call_overhead.py [number of calls]
+
+"""
+
+import os
+import sys
+import time
+
+import numpy as np
+import sympy
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'examples'))
+from loops_main import ExampleCode  # noqa
+
+
+def subs_output_sizes(code, bounds):
+    # What the call path used to do
+    index_subsd = {}
+    for idx, pair in zip(code.indices, bounds):
+        index_subsd[idx.lower] = pair[0]
+        index_subsd[idx.upper] = pair[1]
+    return [int((u.indices[0].upper-u.indices[0].lower).subs(
+        index_subsd)) for u in code.unk]
+
+
+def timeit(cb, n):
+    t0 = time.perf_counter()
+    for _ in range(n):
+        cb()
+    return (time.perf_counter() - t0)/n
+
+
+def main(n=20000):
+    i = sympy.Idx('i', sympy.symbols('i_lb i_ub', integer=True))
+    a, x = sympy.IndexedBase('a'), sympy.IndexedBase('x')
+    c = sympy.Symbol('c', real=True)
+    code = ExampleCode([sympy.Eq(x[i], a[i]*c)], (a[i], c), (i,))
+    inp, bounds = [np.linspace(0, 1, 3), 2.0], [(0, 3)]
+    bounds_arr = np.array(bounds, dtype=np.int32).flatten()
+    buf = np.empty(3)
+    code(inp, bounds=bounds)  # compile & import
+
+    assert code._output_sizes(bounds_arr) == subs_output_sizes(code, bounds)
+    for name, cb, ncalls in [
+            ('output sizes (subs)', lambda: subs_output_sizes(code, bounds), n//20),
+            ('output sizes (plan)', lambda: code._output_sizes(bounds_arr), n),
+            ('__call__', lambda: code(inp, bounds=bounds), n),
+            ('__call__ (out=buf)', lambda: code(inp, bounds=bounds, out=buf), n)]:
+        print('{:>20}: {:8.2f} us/call'.format(name, 1e6*timeit(cb, ncalls)))
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
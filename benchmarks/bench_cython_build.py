@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Build latency of ``Cython_Code``: direct cythonize/compile/link
+pipeline versus building the extension via ``setuptools.setup``.
+
+Usage::
+
+    $ python3 bench_cython_build.py [number of builds]
+
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from pycodeexport.codeexport import Cython_Code
+
+
+class SetuptoolsCode(Cython_Code):
+    # How Cython_Code used to build the extension
+
+    def _compile(self):
+        from Cython.Distutils import build_ext
+        from setuptools import setup, Extension
+
+        sources = [os.path.join(
+            self._tempdir, os.path.basename(x).replace(
+                '_template', '')) for x in self.source_files]
+        kw = dict((k, self.compile_kwargs.get(k, [])) for k in (
+            'include_dirs', 'libraries', 'library_dirs'))
+        dist = setup(
+            script_name='DUMMY_SCRIPT_NAME',
+            script_args=['-q', 'build_ext', '--build-lib', self._tempdir,
+                         '--build-temp', os.path.join(self._tempdir, 'build')],
+            cmdclass={'build_ext': build_ext},
+            ext_modules=[Extension(self.extension_name, sources, **kw)])
+        self.so_file = os.path.basename(
+            dist.get_command_obj('build_ext').get_ext_fullpath(
+                self.extension_name))
+
+
+def mk_Code(Base, basedir, i):
+    class Code(Base):
+        templates = ['bench_ext_template.pyx']
+        source_files = ['bench_ext_template.pyx']
+        extension_name = 'bench_ext'
+
+        def variables(self):
+            return {'value': i}
+    Code.basedir = basedir
+    return Code
+
+
+def main(n=5):
+    basedir = tempfile.mkdtemp()
+    with open(os.path.join(basedir, 'bench_ext_template.pyx'), 'wt') as ofh:
+        ofh.write('def value():\n    return ${value}\n')
+    try:
+        mk_Code(Cython_Code, basedir, -1)().mod  # warm up (import Cython)
+        for Base in (SetuptoolsCode, Cython_Code):
+            t0 = time.perf_counter()
+            for i in range(n):
+                code = mk_Code(Base, basedir, i)()
+                assert code.mod.value() == i
+                del code
+            print('{:>16}: {:6.3f} s/build'.format(
+                Base.__name__, (time.perf_counter() - t0)/n))
+    finally:
+        shutil.rmtree(basedir)
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
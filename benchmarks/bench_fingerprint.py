@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Cost of ``Generic_Code.fingerprint`` compared with ``get_cse_code``
+for the expressions of ``bench_arrayify.py``.
+
+Usage::
+
+    $ python3 bench_fingerprint.py [number of expressions]
+
+"""
+
+import sys
+import time
+
+from pycodeexport.codeexport import C_Code
+
+from bench_arrayify import mk_exprs
+
+
+class ModelCode(C_Code):
+    lazy = True
+
+    def __init__(self, exprs, dummy_groups, arrayify_groups, **kwargs):
+        self.exprs = exprs
+        self.dummy_groups = dummy_groups
+        self.arrayify_groups = arrayify_groups
+        super(ModelCode, self).__init__(**kwargs)
+
+
+def main(n=10000):
+    code = ModelCode(*mk_exprs(n))
+    t0 = time.perf_counter()
+    code.fingerprint()
+    t1 = time.perf_counter()
+    code.get_cse_code(code.exprs, dummy_groups=code.dummy_groups,
+                      arrayify_groups=code.arrayify_groups)
+    t2 = time.perf_counter()
+    print('fingerprint: {:.3f} s, get_cse_code: {:.3f} s'.format(t1 - t0, t2 - t1))
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
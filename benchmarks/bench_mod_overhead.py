@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Call overhead of functions looked up on ``Generic_Code.mod``: the
+module proxy (``Interceptor``) versus its former implementation which
+compared paths (and possibly re-imported) on every attribute lookup.
+
+Usage::
+
+    $ python3 bench_mod_overhead.py [number of calls]
+
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from pycompilation.util import import_module_from_file
+
+from pycodeexport.codeexport import Cython_Code
+
+
+class LegacyInterceptor(object):
+
+    def __init__(self, binary_path):
+        self._binary_path = binary_path
+        self._binary_mod = import_module_from_file(self._binary_path)
+
+    def __getattr__(self, key):
+        if key == '__file__':
+            return self._binary_mod.__file__
+        if self._binary_mod.__file__ != self._binary_path:
+            self._binary_mod = import_module_from_file(self._binary_path)
+        return getattr(self._binary_mod, key)
+
+
+class BenchCode(Cython_Code):
+    templates = ['bench_mod_template.pyx']
+    source_files = ['bench_mod_template.pyx']
+    extension_name = 'bench_mod'
+
+
+def timeit(cb, n):
+    t0 = time.perf_counter()
+    for _ in range(n):
+        cb()
+    return (time.perf_counter() - t0)/n
+
+
+def main(n=1000000):
+    BenchCode.basedir = tempfile.mkdtemp()
+    with open(os.path.join(BenchCode.basedir, 'bench_mod_template.pyx'), 'wt') as ofh:
+        ofh.write('def f():\n    return 42\n')
+    try:
+        code = BenchCode()
+        mod, legacy = code.mod, LegacyInterceptor(code.binary_path)
+        f = mod.f
+        for name, cb in [('legacy: mod.f()', lambda: legacy.f()),
+                         ('mod.f()', lambda: mod.f()),
+                         ('f = mod.f; f()', lambda: f())]:
+            print('{:>16}: {:6.1f} ns/call'.format(name, 1e9*timeit(cb, n)))
+    finally:
+        shutil.rmtree(BenchCode.basedir)
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
@@ -82,9 +82,11 @@ def generate_code(tempd):
 
 
 def bench_binary_op(py_op, cb, a, b):
+    out = np.empty_like(a)
     t1 = time.time()
-    x = cb(a, b)
+    x = cb(a, b, out=out)
     t2 = time.time()
+    assert x is out
     xref = py_op(a, b)
     t3 = time.time()
     assert np.allclose(x, xref)
@@ -14,41 +14,49 @@ cdef extern void c_vec${opname}_${ctype}(
 %endfor
 
 %for opname, opfmt, vec_opfmt in ops:
-def elem${opname}(a, b):
+def elem${opname}(a, b, out=None):
+    """ Writes to ``out`` when given (C-contiguous, same length & dtype as ``a``) """
     if not isinstance(a, np.ndarray):
         raise TypeError('Numpy arrays only supported.')
     %for ctype, nptype, vectype, vecsize in types:
     elif a.dtype == np.${nptype}:
-        return _elem${opname}_${ctype}(a,b)
+        return _elem${opname}_${ctype}(a, b, out)
     %endfor
     raise RuntimeError('Unsupported dtype')
 
 %if vec_opfmt != None:
-def vec${opname}(a, b):
+def vec${opname}(a, b, out=None):
+    """ Writes to ``out`` when given (C-contiguous, same length & dtype as ``a``) """
     if not isinstance(a, np.ndarray):
         raise TypeError('Numpy arrays only supported.')
     %for ctype, nptype, vectype, vecsize in types:
     elif a.dtype == np.${nptype}:
-        return _vec${opname}_${ctype}(a,b)
+        return _vec${opname}_${ctype}(a, b, out)
     %endfor
     raise RuntimeError('Unsupported dtype')
 %endif
 %endfor
 
 %for (opname, opfmt, vec_opfmt), (ctype, nptype, vectype, vecsize) in combos:
-cdef cnp.ndarray[cnp.${nptype}_t, ndim=1] _elem${opname}_${ctype}(${ctype} [:] a,
-                               ${ctype} [:] b):
-    cdef cnp.ndarray[cnp.${nptype}_t, ndim=1] c = np.empty_like(
-        a, dtype=np.${nptype})
-    c_elem${opname}_${ctype}(a.shape[0], &a[0], &b[0], &c[0])
-    return c
+cdef _elem${opname}_${ctype}(${ctype} [::1] a, ${ctype} [::1] b, out):
+    if out is None:
+        out = np.empty(a.shape[0], dtype=np.${nptype})
+    cdef ${ctype} [::1] c = out
+    if not a.shape[0] == b.shape[0] == c.shape[0]:
+        raise ValueError("Arrays of unequal length")
+    if a.shape[0] > 0:
+        c_elem${opname}_${ctype}(a.shape[0], &a[0], &b[0], &c[0])
+    return out
 
 %if vec_opfmt != None:
-cdef cnp.ndarray[cnp.${nptype}_t, ndim=1] _vec${opname}_${ctype}(${ctype} [:] a,
-                               ${ctype} [:] b):
-    cdef cnp.ndarray[cnp.${nptype}_t, ndim=1] c = np.empty_like(
-        a, dtype=np.${nptype})
-    c_vec${opname}_${ctype}(a.shape[0], &a[0], &b[0], &c[0])
-    return c
+cdef _vec${opname}_${ctype}(${ctype} [::1] a, ${ctype} [::1] b, out):
+    if out is None:
+        out = np.empty(a.shape[0], dtype=np.${nptype})
+    cdef ${ctype} [::1] c = out
+    if not a.shape[0] == b.shape[0] == c.shape[0]:
+        raise ValueError("Arrays of unequal length")
+    if a.shape[0] > 0:
+        c_vec${opname}_${ctype}(a.shape[0], &a[0], &b[0], &c[0])
+    return out
 %endif
 %endfor
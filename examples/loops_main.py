@@ -40,6 +40,8 @@ class ExampleCode(C_Code):
         'loops.o',
         'loops_wrapper.o',
     ]
+    unique_module_name = True  # loops_wrapper_<digest>: variants coexist
+    lazy = True  # code is generated on first call
 
     def __init__(self, eqs, inputs, indices, **kwargs):
         self.unk = [x.lhs for x in eqs]
@@ -63,6 +65,14 @@ class ExampleCode(C_Code):
 
         super(ExampleCode, self).__init__(**kwargs)
 
+        # Lower the output layout to a function of the (flattened) bounds
+        # once, keeping SymPy out of the call path.
+        bnd_symbs = [b for idx in self.indices for b in (idx.lower, idx.upper)]
+        self._output_plan = sympy.lambdify(bnd_symbs, [
+            u.indices[0].upper - u.indices[0].lower if isinstance(
+                u, sympy.Indexed) else sympy.Integer(1) for u in self.unk
+        ], modules=[])
+
     def _mk_recursive_loop(self, idxs, body):
         if len(idxs) == 0:
             return body
@@ -122,37 +132,79 @@ class ExampleCode(C_Code):
             'expr_groups': expr_groups
         }
 
-    def __call__(self, inp, bounds=None, inpi=None):
+    def _output_sizes(self, bounds_arr):
+        return [int(n) for n in self._output_plan(*bounds_arr.tolist())]
+
+    @staticmethod
+    def _split_output(outd, sizes):
+        output = []
+        i = 0
+        for n in sizes:
+            output.append(outd[..., i:i+n])
+            i += n
+        return output
+
+    _no_inpi = np.empty((0,), dtype=np.int32)  # shared, never written to
+
+    def __call__(self, inp, bounds=None, inpi=None, out=None):
+        """
+        Returns views (one per output) into ``out`` (a C-contiguous float64
+        array which is reused without copying) or, by default, into a newly
+        allocated array.
+        """
         inp_arr = np.ascontiguousarray(np.concatenate(
             [[x] if isinstance(x, float) else x for x in inp]
         ), dtype=np.float64)
         bounds_arr = np.ascontiguousarray(bounds, dtype=np.int32).flatten()
         if inpi is None:
-            inpi_arr = np.empty((0,), dtype=np.int32)
+            inpi_arr = self._no_inpi
         else:
             inpi_arr = np.ascontiguousarray(inpi, dtype=np.int32)
-        assert all([len(u.indices) == 1 for u in self.unk])
-        index_subsd = {}
-        for idx, pair in zip(self.indices, bounds):
-            index_subsd[idx.lower] = pair[0]
-            index_subsd[idx.upper] = pair[1]
-        noutd = sum([u.indices[0].upper-u.indices[0].lower for u
-                     in self.unk]).subs(index_subsd)
+        sizes = self._output_sizes(bounds_arr)
         nouti = 0
         outd, outi = self.mod.arbitrary_func(
-            bounds_arr, inp_arr, inpi_arr, noutd, nouti)
-        output = []
-        i = 0
-        for u in self.unk:
-            n = u.indices[0].upper-u.indices[0].lower
-            n = n.subs(index_subsd)
-            output.append(outd[i:i+n])
-            i += n
+            bounds_arr, inp_arr, inpi_arr, sum(sizes), nouti, out)
+        return self._split_output(outd, sizes)
+
+    def batch(self, inp, bounds, inpi=None, num_threads=0, out=None):
+        """
+        Evaluates many sets of input (rows of the 2-D array ``inp``,
+        each row being the concatenated input of :meth:`__call__`)
+        sharing the same ``bounds`` in one call to compiled code
+        (using ``num_threads`` threads when ``openmp`` is set).
+        Results are written to ``out`` (C-contiguous float64 array of
+        shape (nsets, noutd)) if given.
+        """
+        inp_arr = np.ascontiguousarray(inp, dtype=np.float64)
+        nsets = inp_arr.shape[0]
+        bounds_arr = np.ascontiguousarray(bounds, dtype=np.int32).flatten()
+        if inpi is None:
+            inpi_arr = np.empty((nsets, 0), dtype=np.int32)
+        else:
+            inpi_arr = np.ascontiguousarray(inpi, dtype=np.int32)
+        sizes = self._output_sizes(bounds_arr)
+        if out is None:
+            outd = np.empty((nsets, sum(sizes)), dtype=np.float64)
+        elif out.shape != (nsets, sum(sizes)):
+            raise ValueError("Expected out of shape {}".format(
+                (nsets, sum(sizes))))
+        else:
+            outd = out
+        outi = np.empty((nsets, 0), dtype=np.int32)
+        self.mod.arbitrary_func_batch(
+            bounds_arr, inp_arr, inpi_arr, outd, outi, num_threads)
+        return self._split_output(outd, sizes)
 
-        return output
 
+class OpenMPExampleCode(ExampleCode):
+    """
+    Parallelizes outermost loops and the loop over sets in batch
+    """
+    openmp = True
+    omp_schedule = 'dynamic, 16'
 
-def model1(inps, lims, logger=None):
+
+def model1(inps, lims, logger=None, Code=ExampleCode):
     """
     x[i] = (a[i]/3-1)**i + c
     y[j] = a[j] - j
@@ -178,19 +230,43 @@ def model1(inps, lims, logger=None):
         sympy.Eq(y[j], a[j]-j),
     ]
 
-    ex_code = ExampleCode(eqs, (a[i], c), (i, j),
-                          logger=logger, save_temp=True)
+    ex_code = Code(eqs, (a[i], c), (i, j), logger=logger, save_temp=True)
     x_, y_ = ex_code(inps, bounds=(ilim, jlim))
     x_ref = (a_arr/3-1)**np.arange(ilim[0], ilim[1]) + c_
     y_ref = a_arr[jlim[0]:jlim[1]] - np.arange(jlim[0], jlim[1])
     assert np.allclose(x_, x_ref)
     assert np.allclose(y_, y_ref)
 
+    # Reusing an output buffer
+    buf = np.empty(x_.size + y_.size)
+    x_, y_ = ex_code(inps, bounds=(ilim, jlim), out=buf)
+    assert np.may_share_memory(x_, buf) and np.allclose(x_, x_ref)
+    try:
+        ex_code(inps, bounds=(ilim, jlim), out=buf[::-1])
+    except ValueError:
+        pass  # not contiguous
+    else:
+        raise AssertionError("Expected ValueError")
+
+    # Many sets of input in one call
+    c_arr = c_ + np.arange(5.0)
+    inp2d = np.column_stack([np.tile(a_arr, (c_arr.size, 1)), c_arr])
+    out2d = np.empty((c_arr.size, buf.size))
+    x2d, y2d = ex_code.batch(inp2d, bounds=(ilim, jlim), num_threads=2,
+                             out=out2d)
+    assert np.may_share_memory(x2d, out2d)
+    assert x2d.shape == (c_arr.size, ilim[1] - ilim[0])
+    for c_val, x_row, y_row in zip(c_arr, x2d, y2d):
+        assert np.allclose(x_row, x_ref - c_ + c_val)
+        assert np.allclose(y_row, y_ref)
+
 
 def main(logger=None):
     a_arr = np.linspace(0, 10, 11)
     c_ = 3.5
     model1([a_arr, c_], [(0, 11), (0, 7)], logger=logger)
+    model1([a_arr, c_], [(0, 11), (0, 7)], logger=logger,
+           Code=OpenMPExampleCode)
 
 
 if __name__ == '__main__':
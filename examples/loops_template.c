@@ -5,14 +5,17 @@
 </%doc>
 
 #include <math.h>
+%if openmp:
+#include <omp.h>
+%endif
 
 ##// Essentially "import pycodeexport.codeexport as ce"
 <%namespace name="ce" module="pycodeexport.codeexport"/>
 
 ## Mako namespace uses a functools.partial shim, hence .func
-<%def name="render_group(group)">
+<%def name="render_group(group, parallel=False)">
 %if isinstance(group, ce.Loop.func):
-    ${nested_loop(*group)}
+    ${nested_loop(*group, parallel=parallel)}
 %else:
   %for line in group:
     ${line}
@@ -21,7 +24,10 @@
 </%def>
 
 
-<%def name="nested_loop(ctr, bounds, body, typ='int')">
+<%def name="nested_loop(ctr, bounds, body, typ='int', parallel=False)">
+  %if parallel:
+  ${omp_parallel_for()}
+  %endif
   for (${typ} ${ctr}=${bounds[0]}; ${ctr}<${bounds[1]}; ++${ctr}){ 
     ${render_group(body)}
   }
@@ -40,7 +46,35 @@ int _arbitrary_func(const int * const restrict bnds,
     ${alias}
   %endfor
   %for group in expr_groups:
-    ${render_group(group)}
+    ${render_group(group, parallel=True)}
   %endfor
   return 0;
 }
+
+// Evaluates _arbitrary_func for nsets sets of input (rows of the
+// row-major inpd/inpi arrays with leading dimensions ld_inpd/ld_inpi)
+// populating the corresponding rows of outd/outi (using nthreads
+// threads if compiled with OpenMP, nthreads < 1 implies default),
+// returns the number of sets for which _arbitrary_func failed.
+int _arbitrary_func_batch(const int nsets,
+			  const int * const restrict bnds,
+			  const double * const restrict inpd, const int ld_inpd,
+			  const int * const restrict inpi, const int ld_inpi,
+			  double * const restrict outd, const int ld_outd,
+			  int * const restrict outi, const int ld_outi,
+			  const int nthreads)
+{
+  int nfailed = 0;
+%if openmp:
+  const int nt = (nthreads > 0) ? nthreads : omp_get_max_threads();
+%else:
+  (void)nthreads;  // unused
+%endif
+  ${omp_parallel_for(num_threads='nt', clauses='reduction(+:nfailed)')}
+  for (int s=0; s<nsets; ++s){
+    if (_arbitrary_func(bnds, inpd + s*ld_inpd, inpi + s*ld_inpi,
+			outd + s*ld_outd, outi + s*ld_outi) != 0)
+      ++nfailed;
+  }
+  return nfailed;
+}
@@ -1,5 +1,4 @@
 # -*- coding: utf-8 -*-
-cimport numpy as cnp
 import numpy as np
 
 cdef extern int _arbitrary_func(
@@ -9,23 +8,69 @@ cdef extern int _arbitrary_func(
     double * const outd,
     int * const outi)
 
+cdef extern int _arbitrary_func_batch(
+    const int nsets,
+    const int * const bounds,
+    const double * const inpd, const int ld_inpd,
+    const int * const inpi, const int ld_inpi,
+    double * const outd, const int ld_outd,
+    int * const outi, const int ld_outi,
+    const int nthreads)
+
 def arbitrary_func(int [::1] bounds,
                    double [::1] inpd,
                    int [::1] inpi,
-                   int noutd, int nouti):
-    """ Thin Cython shim for passing array data to _arbitrary_func """
-    cdef cnp.ndarray[cnp.int32_t, ndim=1] arr_bounds = np.asarray(bounds, dtype=np.int32)
-    cdef cnp.ndarray[cnp.float64_t, ndim=1] arr_inpd = np.asarray(inpd, dtype=np.float64)
-    cdef cnp.ndarray[cnp.int32_t, ndim=1] arr_inpi = np.asarray(inpi, dtype=np.int32)
-    cdef cnp.ndarray[cnp.float64_t, ndim=1] arr_outd = np.empty(noutd, dtype=np.float64)
-    cdef cnp.ndarray[cnp.int32_t, ndim=1] arr_outi = np.empty(nouti, dtype=np.int32)
+                   int noutd, int nouti,
+                   outd=None, outi=None):
+    """ Thin Cython shim for passing array data to _arbitrary_func
+
+    Results are written to ``outd``/``outi`` if given (C-contiguous
+    float64/int32 arrays of length ``noutd``/``nouti``, a ValueError is
+    raised otherwise), else new arrays are allocated.
+    """
+    if outd is None:
+        outd = np.empty(noutd, dtype=np.float64)
+    if outi is None:
+        outi = np.empty(nouti, dtype=np.int32)
+    cdef double [::1] view_outd = outd
+    cdef int [::1] view_outi = outi
+    if view_outd.shape[0] != noutd or view_outi.shape[0] != nouti:
+        raise ValueError("Output arrays of incorrect length")
     cdef int status = _arbitrary_func(
-        <int *>arr_bounds.data,
-        <double *>arr_inpd.data,
-        <int *>arr_inpi.data,
-        <double *>arr_outd.data,
-        <int *>arr_outi.data
-    )
+        &bounds[0] if bounds.shape[0] else NULL,
+        &inpd[0] if inpd.shape[0] else NULL,
+        &inpi[0] if inpi.shape[0] else NULL,
+        &view_outd[0] if noutd else NULL,
+        &view_outi[0] if nouti else NULL)
     if status != 0: raise RuntimeError(
             "_arbitrary_func unsuccessful (status={})".format(status))
-    return arr_outd, arr_outi
+    return outd, outi
+
+
+def arbitrary_func_batch(int [::1] bounds,
+                         double [:, ::1] inpd,
+                         int [:, ::1] inpi,
+                         double [:, ::1] outd,
+                         int [:, ::1] outi,
+                         int num_threads=0):
+    """ Evaluates _arbitrary_func for every row of inpd/inpi
+
+    The loop over rows runs in compiled code (in parallel using
+    ``num_threads`` threads if compiled with OpenMP, default: 0 implies
+    OpenMP's default), and the results are written into the
+    (preallocated) rows of outd and outi.
+    """
+    cdef int nsets = inpd.shape[0]
+    if not inpi.shape[0] == outd.shape[0] == outi.shape[0] == nsets:
+        raise ValueError("Inconsistent number of sets")
+    if nsets == 0:
+        return
+    cdef int nfailed = _arbitrary_func_batch(
+        nsets, &bounds[0],
+        &inpd[0, 0] if inpd.shape[1] else NULL, inpd.shape[1],
+        &inpi[0, 0] if inpi.shape[1] else NULL, inpi.shape[1],
+        &outd[0, 0] if outd.shape[1] else NULL, outd.shape[1],
+        &outi[0, 0] if outi.shape[1] else NULL, outi.shape[1],
+        num_threads)
+    if nfailed != 0: raise RuntimeError(
+            "_arbitrary_func_batch unsuccessful for {} sets".format(nfailed))
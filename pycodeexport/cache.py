@@ -0,0 +1,425 @@
+# -*- coding: utf-8 -*-
+from __future__ import print_function, division, absolute_import
+
+"""
+Content-addressed on-disk cache of built binaries.
+
+Entries are directories named by a hex digest of everything which
+influences the build (rendered sources, compiler identity, flags).
+An entry is populated in a private staging directory and then
+atomically renamed into place, hence readers never see partially
+written entries. Bookkeeping (statistics and eviction) is serialized
+between processes using an advisory lock on a file in the cache root.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import sys
+import sysconfig
+import tempfile
+import types
+
+from contextlib import contextmanager
+from functools import partial
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None  # No inter-process locking (e.g. Windows)
+
+
+def default_cache_dir():
+    return os.environ.get('PYCODEEXPORT_CACHE_DIR', os.path.join(
+        os.path.expanduser('~'), '.cache', 'pycodeexport'))
+
+
+def _default_max_size():
+    return int(os.environ.get('PYCODEEXPORT_CACHE_MAX_SIZE', 2**30))
+
+
+def python_identity():
+    """ Identifies the ABI of the running interpreter. """
+    return (sys.version, sysconfig.get_config_var('EXT_SUFFIX'), sys.platform)
+
+
+def _token(md, tag, payload):
+    md.update(tag + str(len(payload)).encode('ascii') + b':' + payload)
+
+
+def _sub_digest(obj, memo, active):
+    md = hashlib.sha256()
+    _feed(md, obj, memo, active)
+    return md.digest()
+
+
+def _feed_sympy(md, expr, memo, active):
+    key = (type(expr), expr)  # e.g. Float(1) == Integer(1) in old SymPy
+    try:
+        digest = memo.get(key)
+    except TypeError:  # unhashable
+        digest = None
+    if digest is None:
+        sub = hashlib.sha256()
+        if expr.args:
+            _token(sub, b'F', expr.func.__name__.encode('utf-8'))
+            for arg in expr.args:
+                _feed(sub, arg, memo, active)
+        elif expr.is_Symbol and not expr.is_Dummy:
+            _token(sub, b'S', repr((type(expr).__name__, expr.name, sorted(
+                expr.assumptions0.items()))).encode('utf-8'))
+        else:
+            import sympy
+            _token(sub, b'A', sympy.srepr(expr).encode('utf-8'))
+        digest = sub.digest()
+        try:
+            memo[key] = digest
+        except TypeError:
+            pass
+    _token(md, b'E', digest)
+
+
+_library_dirs = tuple(set(
+    os.path.join(os.path.abspath(sysconfig.get_paths()[k]), '')
+    for k in ('stdlib', 'platstdlib', 'purelib', 'platlib')))
+_package_dir = os.path.dirname(os.path.abspath(__file__))
+
+
+def _is_library(func):
+    # Functions of installed packages (and of pycodeexport itself, but
+    # not its tests) are identified by name, user code by its content.
+    path = getattr(sys.modules.get(func.__module__ or ''), '__file__', None)
+    if path is None:
+        return False  # e.g. __main__ of an interactive session
+    path = os.path.abspath(path)
+    return os.path.dirname(path) == _package_dir or \
+        path.startswith(_library_dirs)
+
+
+def _global_names(code):
+    names = set(code.co_names)
+    for const in code.co_consts:
+        if isinstance(const, types.CodeType):
+            names |= _global_names(const)
+    return names
+
+
+def _feed_code(md, code, memo, active):
+    _token(md, b'k', code.co_code)
+    _feed(md, (code.co_argcount, code.co_kwonlyargcount, code.co_flags,
+               code.co_names, code.co_varnames), memo, active)
+    for const in code.co_consts:
+        if isinstance(const, types.CodeType):
+            _feed_code(md, const, memo, active)
+        else:
+            _feed(md, const, memo, active)
+
+
+def _feed_function(md, func, memo, active):
+    _token(md, b'f', '{}.{}'.format(func.__module__,
+                                    func.__qualname__).encode('utf-8'))
+    if _is_library(func):
+        return
+    if id(func) in active:  # recursion
+        _token(md, b'r', b'')
+        return
+    active.add(id(func))
+    _feed_code(md, func.__code__, memo, active)
+    cells = []
+    for cell in func.__closure__ or ():
+        try:
+            cells.append(cell.cell_contents)
+        except ValueError:  # empty cell
+            cells.append(None)
+    globs = func.__globals__
+    _feed(md, (func.__defaults__, func.__kwdefaults__, cells, dict(
+        (name, globs[name]) for name in _global_names(func.__code__)
+        if name in globs and not isinstance(globs[name], types.ModuleType))
+    ), memo, active)
+    active.discard(id(func))
+
+
+def _feed(md, obj, memo, active):
+    sympy = sys.modules.get('sympy')
+    numpy = sys.modules.get('numpy')
+    if isinstance(obj, str):
+        _token(md, b's', obj.encode('utf-8'))
+    elif isinstance(obj, bytes):
+        _token(md, b'b', obj)
+    elif obj is None or isinstance(obj, (bool, int, float, complex)):
+        _token(md, b'n', repr(obj).encode('ascii'))
+    elif sympy is not None and isinstance(obj, sympy.Basic):
+        _feed_sympy(md, obj, memo, active)
+    elif isinstance(obj, type):
+        _token(md, b'c', '{}.{}'.format(
+            obj.__module__, obj.__qualname__).encode('utf-8'))
+    elif numpy is not None and isinstance(obj, numpy.ndarray):
+        _token(md, b'a', repr((obj.dtype.str, obj.shape)).encode('ascii'))
+        _token(md, b'b', numpy.ascontiguousarray(obj).tobytes())
+    elif isinstance(obj, (dict, set, frozenset)):
+        # Order independent: sorted digests of the items
+        items = obj.items() if isinstance(obj, dict) else obj
+        _token(md, b'd' if isinstance(obj, dict) else b'u', b''.join(
+            sorted(_sub_digest(item, memo, active) for item in items)))
+    elif isinstance(obj, (list, tuple)):
+        _token(md, b'l', type(obj).__qualname__.encode('utf-8'))
+        _token(md, b'n', str(len(obj)).encode('ascii'))
+        for item in obj:
+            _feed(md, item, memo, active)
+    elif isinstance(obj, partial):
+        _token(md, b'p', b'')
+        _feed(md, (obj.func, obj.args, obj.keywords), memo, active)
+    elif isinstance(obj, types.FunctionType):
+        _feed_function(md, obj, memo, active)
+    elif isinstance(obj, types.MethodType):
+        _token(md, b'm', b'')
+        _feed(md, (obj.__func__, obj.__self__), memo, active)
+    elif isinstance(obj, (staticmethod, classmethod)):
+        _token(md, b'm', type(obj).__name__.encode('utf-8'))
+        _feed(md, obj.__func__, memo, active)
+    elif isinstance(obj, property):
+        _token(md, b'y', b'')
+        _feed(md, (obj.fget, obj.fset, obj.fdel), memo, active)
+    elif callable(obj) and hasattr(obj, '__qualname__'):
+        _token(md, b'f', '{}.{}'.format(getattr(obj, '__module__', ''),
+                                        obj.__qualname__).encode('utf-8'))
+    elif hasattr(obj, '__dict__'):
+        if id(obj) in active:  # reference cycle
+            _token(md, b'r', b'')
+            return
+        active.add(id(obj))
+        _feed(md, (type(obj), vars(obj)), memo, active)
+        active.discard(id(obj))
+    else:
+        _token(md, b'o', repr(obj).encode('utf-8'))
+
+
+def stable_digest(*objs):
+    """
+    Hex digest of ``objs`` which is deterministic across processes
+    (independent of the hash seed) and computed without printing SymPy
+    expressions.
+
+    Containers (including namedtuples, dicts and sets) are traversed,
+    SymPy expressions are digested from their expression trees
+    (memoized per call, so shared subexpressions are cheap), NumPy
+    arrays by dtype, shape and content, classes by qualified name and
+    other objects by type and instance dictionary. Functions are digested
+    by qualified name, byte code, constants, defaults, closure cells and
+    the values of referenced module level globals (except modules),
+    except functions of installed packages (and of pycodeexport) which
+    are identified by name only.
+
+    Examples
+    --------
+    >>> stable_digest({'a': 1, 'b': {2, 3}}) == stable_digest({'b': {3, 2}, 'a': 1})
+    True
+    """
+    md = hashlib.sha256()
+    memo, active = {}, set()
+    for obj in objs:
+        _feed(md, obj, memo, active)
+    return md.hexdigest()
+
+
+_compiler_identities = {}
+
+
+def compiler_identity(CompilerRunner_):
+    """
+    Returns a tuple identifying the compiler which `CompilerRunner_`
+    would use (binary path, first line of ``--version``) together with
+    the environment variables it honours. The result is memoized per
+    process.
+    """
+    env = tuple(os.environ.get(k, '') for k in (
+        CompilerRunner_.environ_key_compiler,
+        CompilerRunner_.environ_key_flags,
+        CompilerRunner_.environ_key_ldflags,
+        'COMPILER_VENDOR'))
+    key = (CompilerRunner_, env)
+    if key not in _compiler_identities:
+        if env[0]:
+            binary = env[0]
+        else:
+            binary = CompilerRunner_.find_compiler(
+                None, None, None, use_meta=False)[1]
+        try:
+            version = subprocess.check_output(
+                [binary, '--version'], stderr=subprocess.STDOUT
+            ).decode('utf-8', 'replace').split('\n')[0]
+        except (OSError, subprocess.CalledProcessError):
+            version = ''
+        _compiler_identities[key] = (
+            CompilerRunner_.__name__, binary, version) + env
+    return _compiler_identities[key]
+
+
+class BuildCache(object):
+    """ Size bounded LRU cache of build products, safe for concurrent use.
+
+    Parameters
+    ----------
+    path : str
+        Root directory of the cache. Default: environment variable
+        ``PYCODEEXPORT_CACHE_DIR`` or ``~/.cache/pycodeexport``.
+    max_size : int
+        Maximum total size (in bytes) of stored entries. Least recently
+        used entries are evicted when exceeded. Default: environment
+        variable ``PYCODEEXPORT_CACHE_MAX_SIZE`` or 1 GiB.
+    logger : logging.Logger
+        Optional logger.
+
+    Examples
+    --------
+    >>> cache = BuildCache(tempfile.mkdtemp())
+    >>> key = cache.key('int f(){ return 42; }', ['-O2'])
+    >>> cache.get(key) is None
+    True
+    >>> cache.stats['misses']
+    1
+
+    """
+
+    stats_filename = 'stats.json'
+    lock_filename = '.lock'
+
+    def __init__(self, path=None, max_size=None, logger=None):
+        self.path = os.path.abspath(path or default_cache_dir())
+        self.max_size = _default_max_size() if max_size is None else max_size
+        self.logger = logger
+        if not os.path.isdir(self.path):
+            os.makedirs(self.path, exist_ok=True)
+
+    @staticmethod
+    def key(*parts):
+        """ Hex digest of ``parts`` (str, bytes or repr-able objects). """
+        md = hashlib.sha256()
+        for part in parts:
+            if not isinstance(part, bytes):
+                part = (part if isinstance(part, str) else repr(part)).encode('utf-8')
+            md.update(hashlib.sha256(part).digest())
+        return md.hexdigest()
+
+    def _entry_path(self, key):
+        return os.path.join(self.path, key[:2], key)
+
+    @contextmanager
+    def _locked(self):
+        if fcntl is None:
+            yield
+            return
+        with open(os.path.join(self.path, self.lock_filename), 'a') as fh:
+            fcntl.flock(fh, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(fh, fcntl.LOCK_UN)
+
+    def _read_stats(self):
+        try:
+            with open(os.path.join(self.path, self.stats_filename), 'rt') as ifh:
+                return json.load(ifh)
+        except (IOError, ValueError):
+            return {}
+
+    def _bump(self, **increments):
+        # Caller must hold the lock
+        stats = self._read_stats()
+        for k, v in increments.items():
+            stats[k] = stats.get(k, 0) + v
+        fd, tmp = tempfile.mkstemp(dir=self.path)
+        with os.fdopen(fd, 'wt') as ofh:
+            json.dump(stats, ofh)
+        os.replace(tmp, os.path.join(self.path, self.stats_filename))
+
+    @property
+    def stats(self):
+        """ Dictionary with counters: hits, misses, stores, evictions. """
+        stats = dict.fromkeys(('hits', 'misses', 'stores', 'evictions'), 0)
+        stats.update(self._read_stats())
+        return stats
+
+    def get(self, key):
+        """ Returns path to the entry directory of ``key`` or None.
+
+        A hit marks the entry as recently used.
+        """
+        path = self._entry_path(key)
+        with self._locked():
+            if os.path.isdir(path):
+                os.utime(path, None)
+                self._bump(hits=1)
+            else:
+                path = None
+                self._bump(misses=1)
+        if self.logger:
+            self.logger.info("Build cache {} for key {}".format(
+                'miss' if path is None else 'hit', key))
+        return path
+
+    def put(self, key, files):
+        """ Stores ``files`` (paths) under ``key``, returns entry path. """
+        path = self._entry_path(key)
+        parent = os.path.dirname(path)
+        if not os.path.isdir(parent):
+            os.makedirs(parent, exist_ok=True)
+        staging = tempfile.mkdtemp(prefix='.staging-', dir=self.path)
+        try:
+            for f in files:
+                shutil.copy2(f, staging)
+            with self._locked():
+                if os.path.isdir(path):
+                    shutil.rmtree(staging)  # another process won the race
+                else:
+                    os.rename(staging, path)
+                    self._bump(stores=1)
+                self._evict()
+        except BaseException:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+        return path
+
+    def _entries(self):
+        for prefix in os.listdir(self.path):
+            subdir = os.path.join(self.path, prefix)
+            if len(prefix) != 2 or not os.path.isdir(subdir):
+                continue
+            for key in os.listdir(subdir):
+                entry = os.path.join(subdir, key)
+                size = sum(os.path.getsize(os.path.join(entry, f))
+                           for f in os.listdir(entry))
+                yield os.path.getmtime(entry), size, entry
+
+    def _evict(self):
+        # Caller must hold the lock
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        nevicted = 0
+        for _, size, entry in entries:
+            if total <= self.max_size:
+                break
+            shutil.rmtree(entry, ignore_errors=True)
+            total -= size
+            nevicted += 1
+        if nevicted:
+            self._bump(evictions=nevicted)
+            if self.logger:
+                self.logger.info("Evicted {} entries from build cache".format(
+                    nevicted))
+
+    @property
+    def size(self):
+        """ Total size (in bytes) of stored entries. """
+        return sum(size for _, size, _ in self._entries())
+
+    def clear(self):
+        """ Removes all entries and resets statistics. """
+        with self._locked():
+            for _, _, entry in list(self._entries()):
+                shutil.rmtree(entry, ignore_errors=True)
+            stats_path = os.path.join(self.path, self.stats_filename)
+            if os.path.exists(stats_path):
+                os.unlink(stats_path)
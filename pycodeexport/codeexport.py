@@ -21,26 +21,50 @@ the problem at hand (personal opinion).
 """
 
 # stdlib imports
+import asyncio
+import ctypes
+import filecmp
+import importlib.util
+import inspect
+import itertools
+import multiprocessing
 import tempfile
 import shutil
 import re
 import os
+import threading
+import time
 
-from collections import namedtuple
+from collections import defaultdict, namedtuple, OrderedDict
+from contextlib import contextmanager
+from concurrent.futures import (
+    Future, ProcessPoolExecutor, ThreadPoolExecutor, as_completed, wait
+)
 from functools import partial
 
 # External imports
 import sympy
+try:
+    from sympy.printing.c import C99CodePrinter
+    from sympy.printing.fortran import FCodePrinter
+except ImportError:  # SymPy < 1.7
+    from sympy.printing.ccode import C99CodePrinter
+    from sympy.printing.fcode import FCodePrinter
 from pycompilation.util import (
-    import_module_from_file, copy, make_dirs
+    copy, make_dirs
 )
 from pycompilation.compilation import (
     FortranCompilerRunner, CCompilerRunner,
-    CppCompilerRunner, link_py_so, compile_sources
+    CppCompilerRunner, link, link_py_so, compile_sources,
+    extension_mapping, objext, sharedext
 )
 
 # Intrapackage imports
 from .util import render_mako_template_to, download_files, defaultnamedtuple
+from .cache import (
+    BuildCache, compiler_identity, default_cache_dir, python_identity,
+    stable_digest
+)
 
 Loop = namedtuple('Loop', ('counter', 'bounds', 'body'))
 
@@ -54,16 +78,96 @@ DummyGroup = namedtuple('DummyGroup', 'basename symbols')
 ArrayifyGroup = defaultnamedtuple(
     'ArrayifyGroup', 'basename code_tok offset dim', [None, 0])
 
+# CseChunk instances hold the statements of one chunk function:
+# `defs` is a list of (lhs, rhs) code pairs assigning common
+# subexpressions to a scratch array and `exprs` a list of
+# (index, code) pairs of the (reduced) expressions.
+CseChunk = namedtuple('CseChunk', 'defs exprs')
+
+# PhaseTiming instances accumulate the wall time (in seconds) spent
+# in, and the number of calls of, one phase of a build (see
+# Generic_Code.timings).
+PhaseTiming = namedtuple('PhaseTiming', 'seconds calls')
+
+
+def _dummy_mapping(dummy_groups):
+    """ Mapping from symbols to dummies for all ``dummy_groups``. """
+    mapping = {}
+    for basename, symbs in dummy_groups:
+        mapping.update(zip(symbs, sympy.symbols(
+            basename+':'+str(len(symbs)))))
+    return mapping
+
 
 def _dummify_expr(expr, basename, symbs):
     """
     Useful to robustify prior to e.g. regexp substitution of
     code strings
     """
-    dummies = sympy.symbols(basename+':'+str(len(symbs)))
-    for i, s in enumerate(symbs):
-        expr = expr.subs({s: dummies[i]})
-    return expr
+    return expr.xreplace(_dummy_mapping([(basename, symbs)]))
+
+
+class _NamesPrinterMixin(object):
+    """
+    Prints (sub)expressions found in the ``names`` setting
+    (a dict) as the corresponding string. Symbols with names fully
+    matching any of the compiled regular expressions in the
+    ``name_patterns`` setting are printed as ``callback(match)``.
+    """
+
+    def _print(self, expr, **kwargs):
+        try:
+            return self._settings['names'][expr]
+        except (KeyError, TypeError):
+            return super(_NamesPrinterMixin, self)._print(expr, **kwargs)
+
+    def _print_Symbol(self, expr):
+        for pattern, callback in self._settings['name_patterns']:
+            match = pattern.match(expr.name)
+            if match:
+                return callback(match)
+        return super(_NamesPrinterMixin, self)._print_Symbol(expr)
+
+
+class C99NamesPrinter(_NamesPrinterMixin, C99CodePrinter):
+    _default_settings = dict(C99CodePrinter._default_settings, names={},
+                             name_patterns=())
+
+
+class FNamesPrinter(_NamesPrinterMixin, FCodePrinter):
+    _default_settings = dict(FCodePrinter._default_settings, names={},
+                             name_patterns=())
+
+
+def getitem_code(syntax, token, index, offset=None, dim=0):
+    """ Code for element ``index`` (+ ``offset``) of array ``token``.
+
+    Examples
+    --------
+    >>> getitem_code('C', 'yout', '3', offset=-1)
+    'yout[3-1]'
+    >>> getitem_code('F', 'yout', '3', offset='CONST', dim=-1)
+    'yout(3+CONST,:)'
+
+    """
+    if syntax == 'C':
+        assert dim == 0  # C does not support broadcasting
+    if isinstance(offset, int):
+        offset_str = '{0:+d}'.format(offset)
+    elif offset is None:
+        offset_str = ''
+    else:
+        offset_str = '+'+str(offset)
+
+    if syntax == 'C':
+        return token+'['+index+offset_str+']'
+    elif syntax == 'F':
+        if dim > 0:
+            return token+'('+':,'*dim+index+offset_str+')'  # slow!
+        else:
+            return token+'('+index+offset_str+',:'*-dim+')'  # fast!
+    else:
+        raise ValueError("Unknown syntax: {}".format(syntax))
 
 
 def syntaxify_getitem(syntax, scode, basename, token, offset=None,
@@ -92,44 +196,333 @@ def syntaxify_getitem(syntax, scode, basename, token, offset=None,
     'yout(7-3,:) = x7+i;'
 
     """
-    if syntax == 'C':
-        assert dim == 0  # C does not support broadcasting
-    if isinstance(offset, int):
-        offset_str = '{0:+d}'.format(offset)
-    elif offset is None:
-        offset_str = ''
+    tgt = getitem_code(syntax, token, r'\1', offset, dim)
+    return re.sub(basename+match_regex, tgt, scode)
+
+
+def compile_arrayify_groups(syntax, arrayify_groups, match_regex=r'(\d+)'):
+    r""" Compiles a function arrayifying code for all groups in one pass.
+
+    One alternation pattern covering the basenames of all
+    ``arrayify_groups`` is compiled, and matches are rewritten by
+    dispatching on the matched basename. Longer basenames take
+    precedence and the first group of a basename wins. Unlike repeated
+    application of :func:`syntaxify_getitem`, the output of one group
+    is never rewritten by another group. Basenames only match at the
+    start of an identifier (e.g. not the ``x`` of ``max3``).
+
+    Parameters
+    ----------
+    syntax : str
+        Either 'C' or 'F' for C or Fortran respectively
+    arrayify_groups : iterable of ArrayifyGroup instances
+    match_regex : str
+        Pattern (with one group: the index) following the basename.
+
+    Examples
+    --------
+    >>> arrayify = compile_arrayify_groups('C', [
+    ...     ArrayifyGroup('x', 'y'), ArrayifyGroup('xx', 'z', 1)])
+    >>> arrayify('x0 + xx3*max3(x12)')
+    'y[0] + z[3+1]*max3(y[12])'
+
+    """
+    groups = {}
+    for basename, token, offset, dim in arrayify_groups:
+        groups.setdefault(basename, (token, offset, dim))
+    pattern = re.compile(r'(?<![A-Za-z0-9_])(' + '|'.join(map(re.escape, sorted(
+        groups, key=len, reverse=True))) + ')' + match_regex)
+
+    def callback(match):
+        token, offset, dim = groups[match.group(1)]
+        return getitem_code(syntax, token, match.group(2), offset, dim)
+
+    return partial(pattern.sub, callback)
+
+
+def _omp_parallel_for(syntax, openmp, default_schedule, num_threads=None,
+                      schedule=None, clauses=''):
+    if not openmp:
+        return ''
+    schedule = schedule or default_schedule
+    tokens = {'C': ['#pragma omp parallel for'],
+              'F': ['!$omp parallel do']}[syntax]
+    if schedule:
+        tokens.append('schedule({})'.format(schedule))
+    if num_threads:
+        tokens.append('num_threads({})'.format(num_threads))
+    if clauses:
+        tokens.append(clauses)
+    return ' '.join(tokens)
+
+
+def _omp_end_parallel_for(syntax, openmp):
+    if openmp and syntax == 'F':
+        return '!$omp end parallel do'
+    return ''
+
+
+def _compile_source(src, CompilerRunner_, cwd, kwargs):
+    return compile_sources([src], CompilerRunner_, cwd=cwd, **kwargs)[0]
+
+
+def _timed_compile_source(src, CompilerRunner_, cwd, kwargs):
+    t0 = time.time()
+    obj = _compile_source(src, CompilerRunner_, cwd, kwargs)
+    return obj, time.time() - t0
+
+
+def _pyx_module_kwargs(module_name):
+    # Keyword arguments for pyx2obj naming the module, (newer versions of)
+    # Cython ignore full_module_name when passed a list of sources.
+    return {'full_module_name': module_name,
+            'cy_kwargs': {'module_name': module_name}}
+
+
+def _prime_compilers(files, CompilerRunner_, cwd, kwargs):
+    # Let the choice of compiler be written to the metadata file once
+    # before workers (which would otherwise race to write it) start.
+    for cls in set(CCompilerRunner if f.endswith('.pyx') else (
+            CompilerRunner_ or extension_mapping[os.path.splitext(
+                f)[1].lower()][0]) for f in files):
+        cls.find_compiler(kwargs.get('preferred_vendor', None),
+                          kwargs.get('metadir', None), cwd)
+
+
+def _process_pool(max_workers):
+    # Workers are started by a fork server (or spawned) rather than forked
+    # from a process where other threads may e.g. hold a logging lock
+    # (inherited locked, deadlocking the worker).
+    if 'forkserver' in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context('forkserver')
+        context.set_forkserver_preload([__name__])  # imported once
     else:
-        offset_str = '+'+str(offset)
+        context = multiprocessing.get_context('spawn')
+    return ProcessPoolExecutor(max_workers, mp_context=context)
 
-    c_tgt = token+r'[\1'+offset_str+']'
-    if dim > 0:
-        f_tgt = token+'('+':,'*dim+r'\1'+offset_str+')'  # slow!
+
+def compile_sources_parallel(files, CompilerRunner_=None, cwd=None,
+                             jobs=None, logger=None, executor=None,
+                             per_file_kwargs=None, **kwargs):
+    """ Compile independent source files concurrently.
+
+    Parameters
+    ----------
+    files : iterable of path strings
+        Source files (relative to ``cwd``), may include ``.pyx`` files.
+    CompilerRunner_ : CompilerRunner subclass (optional)
+        See ``pycompilation.compile_sources``.
+    cwd : path string
+        Working directory of the compilers.
+    jobs : int
+        Number of worker processes (default: number of cores).
+    logger : logging.Logger
+    executor : concurrent.futures.ProcessPoolExecutor
+        Use this (shared) pool instead of starting one (``jobs`` is
+        then ignored).
+    per_file_kwargs : dict
+        Mapping of items in ``files`` to additional keyword arguments.
+    **kwargs : dict
+        Keyword arguments passed onto ``pycompilation.compile_sources``.
+
+    Returns
+    -------
+    List of paths to the object files (in the order of ``files``).
+
+    Notes
+    -----
+    All units are compiled even if some of them fail, after which the
+    exception of the first failing unit (in the order of ``files``)
+    is raised, hence error reporting does not depend on scheduling.
+    """
+    files = list(files)
+    cwd = os.path.abspath(cwd or '.')
+    _prime_compilers(files, CompilerRunner_, cwd, kwargs)
+    kwargs['logger'] = logger
+    per_file_kwargs = per_file_kwargs or {}
+
+    def submit(executor):
+        return [executor.submit(_compile_source, f, CompilerRunner_, cwd,
+                                dict(kwargs, **per_file_kwargs.get(f, {})))
+                for f in files]
+
+    if executor is None:
+        with _process_pool(jobs or os.cpu_count()) as executor:
+            futures = submit(executor)
     else:
-        f_tgt = token+'('+r'\1'+offset_str+',:'*-dim+')'  # fast!
-    tgt = {'C': c_tgt, 'F': f_tgt}.get(syntax)
-    return re.sub(basename+match_regex, tgt, scode)
+        futures = submit(executor)
+        wait(futures)
+    errors = [(f, fut.exception()) for f, fut in zip(files, futures)
+              if fut.exception() is not None]
+    if errors:
+        if logger:
+            for f, exc in errors:
+                logger.error("Compilation of {} failed: {}".format(f, exc))
+        raise errors[0][1]
+    return [fut.result() for fut in futures]
+
+
+_import_counter = itertools.count()
+
+
+def import_module_unique(binary_path):
+    """
+    Imports the extension module in ``binary_path`` under a unique
+    (fully qualified) name without registering it in ``sys.modules``,
+    hence modules built with the same name (but at different paths)
+    never shadow each other.
+    """
+    name = os.path.basename(binary_path).split('.')[0]
+    spec = importlib.util.spec_from_file_location('_pycodeexport_{}.{}'.format(
+        next(_import_counter), name), binary_path)
+    if spec is None:
+        raise ImportError("Failed to import {}".format(binary_path))
+    mod = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(mod)
+    return mod
 
 
 class Interceptor(object):
     """
     This is a wrapper for dynamically loaded extension modules
-    which share the same name (they end up overwriting the same
-    python object).
+    which share the same name. The module is imported once under a
+    unique name (see :func:`import_module_unique`) and looked up
+    functions (callables) are cached on the wrapper, hence there is no
+    per call overhead and e.g. functions may be kept by the caller.
+    Other attributes (e.g. module level variables) are looked up on
+    each access.
     """
 
     def __init__(self, binary_path):
         self._binary_path = binary_path
-        self._binary_mod = import_module_from_file(self._binary_path)
+        self._binary_mod = import_module_unique(binary_path)
+        self.__file__ = self._binary_mod.__file__
 
     def __getattr__(self, key):
-        if key == '__file__':
-            return self._binary_mod.__file__
+        if key.startswith('_binary'):
+            raise AttributeError(key)
+        value = getattr(self._binary_mod, key)
+        if callable(value):
+            setattr(self, key, value)  # subsequent lookups bypass __getattr__
+        return value
+
+
+class CtypesModule(object):
+    """
+    Module like wrapper of a shared library loaded with ctypes.
+
+    Parameters
+    ----------
+    binary_path : str
+        Path to shared library.
+    signatures : dict
+        Mapping of function name to ``(restype, argtypes)``, NumPy arrays
+        are conveniently passed using ``numpy.ctypeslib.ndpointer`` in
+        ``argtypes`` (which also validates dtype and contiguity).
+    """
+
+    def __init__(self, binary_path, signatures=None):
+        self.__file__ = binary_path
+        self._lib = ctypes.CDLL(binary_path)
+        for name, (restype, argtypes) in (signatures or {}).items():
+            func = getattr(self._lib, name)
+            func.restype = restype
+            func.argtypes = argtypes
+
+    def __getattr__(self, key):
+        return getattr(self._lib, key)
+
+
+def _file_signature(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_ino, st.st_mtime_ns, st.st_size
+
+
+class BuildPool(object):
+    """
+    Runs builds of :class:`Generic_Code` instances in the background
+    (see :meth:`Generic_Code.compile_async`).
+
+    Parameters
+    ----------
+    max_builds : int
+        Maximum number of concurrent builds, further builds are queued
+        (default: number of cores).
+    jobs : int
+        Number of worker processes (shared by all builds) running
+        compilation of source files (default: number of cores).
+    """
+
+    def __init__(self, max_builds=None, jobs=None):
+        self._threads = ThreadPoolExecutor(max_builds or os.cpu_count())
+        self._processes = _process_pool(jobs or os.cpu_count())
+
+    def submit(self, code):
+        """ Returns a Future resolving to ``code.mod``. """
+        return self._threads.submit(code._build_in_pool, self._processes)
+
+    def shutdown(self, wait=True, cancel_futures=False):
+        self._threads.shutdown(wait, cancel_futures=cancel_futures)
+        self._processes.shutdown(wait, cancel_futures=cancel_futures)
+
+
+_default_build_pool = None
+
+
+def default_build_pool():
+    """ Returns the (lazily created) BuildPool used by default. """
+    global _default_build_pool
+    if _default_build_pool is None:
+        _default_build_pool = BuildPool()
+    return _default_build_pool
+
 
-        if self._binary_mod.__file__ != self._binary_path:
-            # Avoid singleton behaviour. (Python changes binary path
-            # inplace without changing id of Python object)
-            self._binary_mod = import_module_from_file(self._binary_path)
-        return getattr(self._binary_mod, key)
+class BuildRegistry(object):
+    """
+    Registry of loaded builds, used by :meth:`Generic_Code.mod` when
+    set as ``Generic_Code.registry``: instances whose build is already
+    loaded get the module of that build (without compiling).
+
+    When more than ``maxsize`` builds are registered the least recently
+    used is dropped from the registry and the temporary directory of
+    its instance is cleaned up (the module remains usable).
+
+    Parameters
+    ----------
+    maxsize : int
+    """
+
+    def __init__(self, maxsize=32):
+        self.maxsize = maxsize
+        self._builds = OrderedDict()  # key -> (code, mod)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """ Returns module of build ``key`` (or None), marks it as used. """
+        with self._lock:
+            if key not in self._builds:
+                return None
+            self._builds.move_to_end(key)
+            return self._builds[key][1]
+
+    def add(self, key, code, mod):
+        with self._lock:
+            self._builds[key] = (code, mod)
+            self._builds.move_to_end(key)
+            evicted = []
+            while len(self._builds) > self.maxsize:
+                evicted.append(self._builds.popitem(last=False)[1][0])
+        for code in evicted:
+            code.clean()
+
+    def __contains__(self, key):
+        return key in self._builds
+
+    def __len__(self):
+        return len(self._builds)
 
 
 class Generic_Code(object):
@@ -142,6 +535,79 @@ class Generic_Code(object):
     tempdir_basename:  basename of tempdirs created in e.g. /tmp/
     basedir : str
         The path to the directory which relative (source).
+    chunk_templates : list of str
+        Templates rendered (and compiled) once per item in the ``'chunks'``
+        entry returned by :meth:`variables` (available as ``chunk`` and
+        ``chunk_index`` in the template). ``foo_template.c`` is rendered
+        to ``foo_0.c``, ``foo_1.c``, etc.
+    build_cache : BuildCache instance or bool
+        When set, linked binaries are stored in (and fetched from) a
+        content addressed cache keyed by :meth:`build_cache_key`.
+        ``True`` implies a ``BuildCache`` with default settings.
+    obj_cache : BuildCache instance or bool
+        When set, objects of static sources (entries of ``source_files``
+        copied verbatim from ``build_files``, e.g. wrappers) are stored
+        in (and fetched from) this cache, keyed by their content (and
+        that of the other ``build_files``), compiler and flags. Static
+        sources must not include rendered files. ``True`` implies a
+        ``BuildCache`` in the subdirectory ``objects`` of the default
+        cache directory.
+    jobs : int
+        Number of source files compiled concurrently by
+        :meth:`_compile_obj` (``None`` implies number of cores).
+    openmp : bool
+        Compile and link with OpenMP, templates get the variables
+        ``openmp``, ``omp_parallel_for`` and ``omp_end_parallel_for``
+        (see :meth:`omp_parallel_for`).
+    omp_schedule : str
+        Default schedule clause of :meth:`omp_parallel_for`.
+    binding : str
+        How the binary is imported: ``'extension'`` (a Python extension
+        module, e.g. wrapped using Cython) or ``'ctypes'``, in which case
+        ``.pyx`` files among ``source_files`` (and their objects) are
+        skipped, the objects are linked into a plain shared library and
+        ``mod`` is a :class:`CtypesModule` using ``ctypes_signatures``.
+    ctypes_signatures : dict
+        See ``signatures`` of :class:`CtypesModule`.
+    build_pool : BuildPool
+        Used by :meth:`compile_async` (default: :func:`default_build_pool`).
+    unique_module_name : bool
+        Name the module (``module_name``, also available to templates)
+        after a digest of the templates and substitutions, e.g.
+        ``loops_wrapper_3f2a9c0e61d4`` rather than ``loops_wrapper``.
+        The binary and ``.pyx`` sources are compiled using that name
+        (templates of other extension modules should use
+        ``${module_name}``, e.g. in ``PyInit_${module_name}``). The name
+        is a naming aid only, builds are identified by
+        :meth:`build_cache_key` (or :meth:`fingerprint` when ``lazy``).
+    registry : BuildRegistry
+        Registry of loaded builds shared between instances (keyed as
+        the build cache).
+    lazy : bool
+        Defer :meth:`write_code` (i.e. :meth:`variables`) from construction
+        to when it is needed for compilation, the build cache and registry
+        are then keyed by :meth:`fingerprint`: a hit skips code generation.
+        The generated code must hence be determined by what the fingerprint
+        records: inputs, class attributes, the code (closures and globals)
+        of methods, templates and build files. Not recorded are e.g.
+        attributes of imported modules (``config.n``), files read by
+        :meth:`variables` or behaviour of installed packages (other than
+        the compiler and interpreter); use ``lazy = False`` if the code
+        depends on such state.
+    phase_hooks : iterable of callables
+        Called as ``hook(code, phase, seconds)`` when a phase of the build
+        has been timed (see ``timings``).
+    timings : OrderedDict
+        Mapping from phase to ``PhaseTiming(seconds, calls)``, accumulated
+        over the lifetime of the instance. Phases: ``'variables'``,
+        ``'dummify'``, ``'cse'``, ``'print'``, ``'arrayify'`` (in
+        :meth:`get_cse_code` and :meth:`as_arrayified_code`),
+        ``'render'``, ``'compile'``, ``'link'`` and ``'import'``. Note
+        that phases nest, e.g. ``'cse'`` is typically part of
+        ``'variables'``. Time spent in :meth:`as_arrayified_code` is
+        summed over expressions and recorded once per enclosing phase
+        (e.g. per call of :meth:`variables`). Summarized by
+        :meth:`timing_report` (logged after each build).
 
     Notes
     -----
@@ -161,19 +627,38 @@ class Generic_Code(object):
     build_files = None
     source_files = None
     templates = None
+    chunk_templates = None
     obj_files = None
     extension_name = 'generic_extension'
     so_file = None
     extension_name = None
     compile_kwargs = None  # kwargs passed to CompilerRunner
+    build_cache = None
+    obj_cache = None
+    arrayify_mode = 'regex'  # or 'printer', see as_arrayified_code
+    stream_render = False  # see render_mako_template_to(..., stream=True)
+    incremental_write = False  # see write_code
+    lazy = False
+    openmp = False
+    omp_schedule = 'static'
+    jobs = 1  # concurrent compilations in _compile_obj (None: all cores)
+    binding = 'extension'  # or 'ctypes'
+    ctypes_signatures = None
+    build_pool = None
+    unique_module_name = False
+    registry = None
+    phase_hooks = None
 
     list_attributes = (
         '_written_files',  # Track what files are written
         'build_files',   # Files to be copied prior to compilation
         'source_files',
         'templates',
+        'chunk_templates',  # Rendered once per item in variables()['chunks']
         'obj_files',
         '_cached_files',  # Files to be removed between compilations
+        '_chunk_source_files',
+        '_chunk_obj_files',
     )
 
     def __init__(self, tempdir=None, save_temp=False, logger=None):
@@ -184,12 +669,25 @@ class Generic_Code(object):
             collected? (Default: False)
         - `logger`: optional logging.Logger instance.
         """
+        # Attributes set by subclasses prior to calling this method
+        # are taken to be the inputs of the instance (see fingerprint)
+        self._inputs = dict(self.__dict__)
+        self._timings = OrderedDict()
+        self._pending_timings = defaultdict(float)
 
         if self.syntax == 'C':
             self.wcode = partial(sympy.ccode, contract=False)
+            self._Printer = C99NamesPrinter
+            self._printer_settings = {'contract': False}
         elif self.syntax == 'F':
             self.wcode = partial(
                 sympy.fcode, source_format='free', contract=False)
+            self._Printer = FNamesPrinter
+            self._printer_settings = {'source_format': 'free',
+                                      'contract': False}
+        self._dummy_mappings = {}
+        self._printer_names = {}
+        self._arrayifiers = {}
 
         self.basedir = self.basedir or "."
         # setting basedir to:
@@ -216,12 +714,20 @@ class Generic_Code(object):
                 self, lstattr, None) or [])
 
         self.compile_kwargs = self.compile_kwargs or {}
+        if self.openmp:
+            options = list(self.compile_kwargs.get('options', None) or (
+                self.CompilerRunner or CCompilerRunner
+            ).default_compile_options)
+            if 'openmp' not in options:
+                options.append('openmp')
+            self.compile_kwargs = dict(self.compile_kwargs, options=options)
 
         # If .pyx files in self.templates, add .c file to _cached_files
         self._cached_files += [x.replace('_template', '').replace(
             '.pyx', '.c') for x in self.templates if x.endswith('.pyx')]
 
-        self.write_code()
+        if not self.lazy:
+            self.write_code()
 
     def variables(self):
         """
@@ -232,103 +738,705 @@ class Generic_Code(object):
         # To be overloaded
         return {}
 
+    def omp_parallel_for(self, num_threads=None, schedule=None,
+                         clauses=''):
+        """ OpenMP directive for parallelizing the following loop.
+
+        Returns an empty string unless ``openmp`` is set. Available in
+        templates under the same name.
+
+        Parameters
+        ----------
+        num_threads : str
+            Expression (in generated code) for the number of threads.
+        schedule : str
+            e.g. ``'dynamic, 4'`` (default: ``omp_schedule``).
+        clauses : str
+            Additional clauses, e.g. ``'reduction(+:nfail)'``.
+
+        Examples
+        --------
+        >>> class Code(C_Code):
+        ...     openmp = True
+        >>> Code().omp_parallel_for(num_threads='nt')
+        '#pragma omp parallel for schedule(static) num_threads(nt)'
+
+        """
+        return _omp_parallel_for(self.syntax, self.openmp, self.omp_schedule,
+                                 num_threads, schedule, clauses)
+
+    def omp_end_parallel_for(self):
+        """ Closing directive (Fortran) of :meth:`omp_parallel_for`. """
+        return _omp_end_parallel_for(self.syntax, self.openmp)
+
+    def _get_dummy_mapping(self, dummy_groups):
+        """ Cached mapping from symbols to dummies of ``dummy_groups`` """
+        key = tuple((basename, tuple(symbs))
+                    for basename, symbs in dummy_groups)
+        if key not in self._dummy_mappings:
+            self._dummy_mappings[key] = _dummy_mapping(key)
+        return self._dummy_mappings[key]
+
+    def _get_printer_names(self, dummy_groups, arrayify_groups=()):
+        """
+        Cached settings (``names``, ``name_patterns``) for the code
+        printer, printing symbols in ``dummy_groups`` by their dummy name
+        or (when matched by an ArrayifyGroup) as array element, and
+        symbols named as the basename of an ArrayifyGroup followed by
+        an integer as array element.
+        """
+        key = (tuple((basename, tuple(symbs))
+                     for basename, symbs in dummy_groups),
+               tuple(arrayify_groups))
+        if key not in self._printer_names:
+            groups = dict((ag.basename, ag) for ag in arrayify_groups)
+            names = {}
+            for basename, symbs in key[0]:
+                for idx, symb in enumerate(symbs):
+                    if basename in groups:
+                        _, token, offset, dim = groups[basename]
+                        names[symb] = getitem_code(
+                            self.syntax, token, str(idx), offset, dim)
+                    else:
+                        names[symb] = basename + str(idx)
+            name_patterns = tuple(
+                (re.compile(re.escape(basename) + r'(\d+)$'),
+                 partial(lambda args, m: getitem_code(
+                     self.syntax, args[0], m.group(1), *args[1:]),
+                     (token, offset, dim)))
+                for basename, token, offset, dim in arrayify_groups)
+            self._printer_names[key] = names, name_patterns
+        return self._printer_names[key]
+
     def as_arrayified_code(self, expr, dummy_groups=(),
-                           arrayify_groups=(), **kwargs):
-        for basename, symbols in dummy_groups:
-            expr = _dummify_expr(expr, basename, symbols)
+                           arrayify_groups=(), dummify=True,
+                           arrayify_mode=None, **kwargs):
+        """ Code string of ``expr``.
 
-        scode = self.wcode(expr, **kwargs)
+        Parameters
+        ----------
+        expr : sympy expression
+        dummy_groups : iterable of DummyGroup instances
+            Symbols to be replaced by dummies (named basename + index).
+        arrayify_groups : iterable of ArrayifyGroup instances
+        dummify : bool
+            If ``False`` the expression is left untouched and the symbols
+            in ``dummy_groups`` are instead printed using the dummy names
+            (which saves a traversal of the expression).
+        arrayify_mode : str
+            ``'regex'`` (post-process printed code using
+            :func:`syntaxify_getitem`) or ``'printer'`` (print array
+            elements directly, neither dummifying nor post-processing).
+            Default: ``self.arrayify_mode``.
+        **kwargs : dict
+            Keyword arguments passed onto the code printer.
 
-        for basename, code_tok, offset, dim in arrayify_groups:
-            scode = syntaxify_getitem(
-                self.syntax, scode, basename, code_tok, offset, dim)
+        """
+        pending = self._pending_timings  # see _flush_timings
+        t0 = time.perf_counter()
+        if (arrayify_mode or self.arrayify_mode) == 'printer':
+            scode = self._print_code(expr, *self._get_printer_names(
+                dummy_groups, arrayify_groups), **kwargs)
+            pending['print'] += time.perf_counter() - t0
+            return scode
+        if dummy_groups and dummify:
+            expr = expr.xreplace(self._get_dummy_mapping(dummy_groups))
+            t1 = time.perf_counter()
+            pending['dummify'] += t1 - t0
+            t0 = t1
+        if not dummy_groups or dummify:
+            scode = self.wcode(expr, **kwargs)
+        else:
+            scode = self._print_code(expr, *self._get_printer_names(
+                dummy_groups), **kwargs)
+        t1 = time.perf_counter()
+        pending['print'] += t1 - t0
+        scode = self._arrayify(scode, arrayify_groups)
+        pending['arrayify'] += time.perf_counter() - t1
         return scode
 
+    def _print_code(self, expr, names, name_patterns=(), assign_to=None,
+                    **kwargs):
+        settings = dict(self._printer_settings, names=names,
+                        name_patterns=name_patterns, **kwargs)
+        return self._Printer(settings).doprint(expr, assign_to)
+
+    def _arrayify(self, scode, arrayify_groups):
+        if not arrayify_groups:
+            return scode
+        key = tuple(arrayify_groups)
+        if key not in self._arrayifiers:
+            self._arrayifiers[key] = compile_arrayify_groups(
+                self.syntax, key)
+        return self._arrayifiers[key](scode)
+
+    cse_timings = None
+
     def get_cse_code(self, exprs, basename=None,
-                     dummy_groups=(), arrayify_groups=()):
+                     dummy_groups=(), arrayify_groups=(),
+                     optimizations=None, order='canonical',
+                     arrayify_mode=None):
         """ Get arrayified code for common subexpression.
 
+        All expressions are dummified in one pass (simultaneous
+        substitution) prior to common subexpression elimination, and
+        then printed and arrayified (in ``'printer'`` arrayify mode both
+        dummification and post-processing are skipped, see
+        :meth:`as_arrayified_code`). Time spent per stage is stored in
+        the dictionary ``cse_timings`` (and logged) and added to
+        ``timings``.
+
         Parameters
         ----------
         exprs : list of sympy expressions
         basename : str
             Stem of variable names (default: cse).
         dummy_groups : tuples
+        arrayify_groups : tuples
+        optimizations : str or list
+            Passed onto ``sympy.cse``, e.g. ``'basic'``.
+        order : str
+            Passed onto ``sympy.cse``, ``'none'`` is faster than the
+            default (``'canonical'``) for large expressions.
+        arrayify_mode : str
+            ``'regex'`` or ``'printer'`` (default: ``self.arrayify_mode``).
 
         """
         if basename is None:
             basename = 'cse'
+        use_printer = (arrayify_mode or self.arrayify_mode) == 'printer'
+        timings = {}
+        t0 = time.perf_counter()
+        if dummy_groups and not use_printer:
+            mapping = self._get_dummy_mapping(dummy_groups)
+            exprs = [sympy.sympify(expr).xreplace(mapping) for expr in exprs]
+        t1 = time.perf_counter()
+        timings['dummify'] = t1 - t0
+
         cse_defs, cse_exprs = sympy.cse(
-            exprs, symbols=sympy.numbered_symbols(basename))
+            exprs, symbols=sympy.numbered_symbols(basename),
+            optimizations=optimizations, order=order)
+        t2 = time.perf_counter()
+        timings['cse'] = t2 - t1
 
         # Let's convert the new expressions into (arrayified) code
-        cse_defs_code = [
-            (vname, self.as_arrayified_code(
-                vexpr, dummy_groups, arrayify_groups))
-            for vname, vexpr in cse_defs
-        ]
-        cse_exprs_code = [self.as_arrayified_code(
-            x, dummy_groups, arrayify_groups) for x in cse_exprs]
+        if use_printer:
+            names, name_patterns = self._get_printer_names(
+                dummy_groups, arrayify_groups)
+            wcode = partial(self._print_code, names=names,
+                            name_patterns=name_patterns)
+            arrayify_groups = ()  # arrayified during printing
+        else:
+            wcode = self.wcode
+        cse_defs_code = [(vname, wcode(vexpr)) for vname, vexpr in cse_defs]
+        cse_exprs_code = [wcode(x) for x in cse_exprs]
+        t3 = time.perf_counter()
+        timings['print'] = t3 - t2
+
+        cse_defs_code = [(vname, self._arrayify(vcode, arrayify_groups))
+                         for vname, vcode in cse_defs_code]
+        cse_exprs_code = [self._arrayify(x, arrayify_groups)
+                          for x in cse_exprs_code]
+        timings['arrayify'] = time.perf_counter() - t3
+
+        self.cse_timings = timings
+        for phase, seconds in timings.items():
+            self._record_phase(phase, seconds)
+        if self.logger:
+            self.logger.info("get_cse_code ({} exprs): {}".format(
+                len(exprs), ', '.join('{}: {:.3g} s'.format(k, v)
+                                      for k, v in timings.items())))
         return cse_defs_code, cse_exprs_code
 
+    def get_cse_code_chunks(self, exprs, nchunks=None, max_statements=None,
+                            basename=None, scratch='cse_scratch',
+                            dummy_groups=(), arrayify_groups=(), **kwargs):
+        """ Get arrayified code for common subexpressions split into chunks.
+
+        Enormous functions are costly (in time and memory) to optimize
+        for compilers. The statements returned by :meth:`get_cse_code`
+        are here partitioned (in order) into chunks which are meant to
+        be rendered as separate functions (see ``chunk_templates``),
+        called in order by a driver function. Common subexpressions are
+        stored in a scratch array (named ``scratch``) shared between
+        the chunks, hence dependencies between chunks are respected.
+
+        Parameters
+        ----------
+        exprs : list of sympy expressions
+        nchunks : int
+            Number of chunks.
+        max_statements : int
+            Alternative to ``nchunks``: maximum number of statements
+            per chunk.
+        basename : str
+            Stem of variable names (default: cse).
+        scratch : str
+            Name of the scratch array in code.
+        dummy_groups : tuples
+        arrayify_groups : tuples
+        **kwargs : dict
+            Keyword arguments passed onto :meth:`get_cse_code`.
+
+        Returns
+        -------
+        Length of scratch array and list of ``CseChunk`` instances.
+
+        """
+        if basename is None:
+            basename = 'cse'
+        if (nchunks is None) == (max_statements is None):
+            raise ValueError("Specify one of nchunks or max_statements")
+        scratch_group = ArrayifyGroup(
+            basename, scratch, 1 if self.syntax == 'F' else None)
+        cse_defs_code, cse_exprs_code = self.get_cse_code(
+            exprs, basename, dummy_groups,
+            tuple(arrayify_groups) + (scratch_group,), **kwargs)
+        statements = [
+            ('def', (syntaxify_getitem(self.syntax, str(vname), *scratch_group),
+                     vcode)) for vname, vcode in cse_defs_code
+        ] + [('expr', (idx, code)) for idx, code in enumerate(cse_exprs_code)]
+        if nchunks is None:
+            nchunks = -(-len(statements) // max_statements)
+        nchunks = max(1, min(nchunks, len(statements)))
+        size = max(1, -(-len(statements) // nchunks))  # 0 if no exprs
+        chunks = []
+        for offset in range(0, len(statements), size) or [0]:
+            chunk = CseChunk([], [])
+            for kind, stmnt in statements[offset:offset+size]:
+                (chunk.defs if kind == 'def' else chunk.exprs).append(stmnt)
+            chunks.append(chunk)
+        return len(cse_defs_code), chunks
+
     def write_code(self):
-        for path in self._cached_files:
-            # Make sure we start in a clean state
-            rel_path = os.path.join(self._tempdir, path)
-            if os.path.exists(rel_path):
-                os.unlink(rel_path)
+        """
+        Copies ``build_files`` and renders ``templates`` (and
+        ``chunk_templates``) into the temporary directory. Paths of the
+        files actually written (or removed) are stored in ``touched_files``.
+
+        With ``incremental_write`` build files are only copied when they
+        differ from the existing copy, templates are only rendered when
+        the template or its substitutions changed (see
+        ``render_mako_template_to(..., only_update=True)``), and
+        ``_cached_files`` are only removed if any file was written.
+        """
+        self._code_written = True
+        self.touched_files = []
+        if not self.incremental_write:
+            self._remove_cached_files()
         for path in self.build_files:
             # Copy files
             srcpath = os.path.join(self.basedir, path)
             dstpath = os.path.join(self._tempdir, os.path.basename(path))
-            copy(srcpath, dstpath)
+            if not (self.incremental_write and os.path.exists(dstpath) and
+                    filecmp.cmp(srcpath, dstpath, shallow=False)):
+                copy(srcpath, dstpath)
+                self.touched_files.append(dstpath)
             self._written_files.append(dstpath)
 
-        subs = self.variables()
+        with self._timed('variables'):
+            subs = self.variables()
+        self.module_name = self._get_module_name(subs)
+        if self.unique_module_name:
+            self.so_file = self.module_name + sharedext
+        subs.setdefault('module_name', self.module_name)
+        subs.setdefault('openmp', self.openmp)
+        # partials (rather than bound methods) expose their state to
+        # the digest of render_mako_template_to(..., only_update=True)
+        subs.setdefault('omp_parallel_for', partial(
+            _omp_parallel_for, self.syntax, self.openmp, self.omp_schedule))
+        subs.setdefault('omp_end_parallel_for', partial(
+            _omp_end_parallel_for, self.syntax, self.openmp))
         for path in self.templates:
             # Render templates
             srcpath = os.path.join(self.basedir, path)
             outpath = os.path.join(
                 self._tempdir,
                 os.path.basename(path).replace('_template', ''))
-            render_mako_template_to(srcpath, outpath, subs)
-            self._written_files.append(outpath)
+            self._render(srcpath, outpath, subs)
+
+        self._chunk_source_files, self._chunk_obj_files = [], []
+        for path in self.chunk_templates:
+            # Render one file per chunk
+            srcpath = os.path.join(self.basedir, path)
+            for idx, chunk in enumerate(subs.get('chunks', [])):
+                fname = os.path.basename(path).replace(
+                    '_template', '_{}'.format(idx))
+                outpath = os.path.join(self._tempdir, fname)
+                self._render(srcpath, outpath, dict(
+                    subs, chunk=chunk, chunk_index=idx))
+                self._chunk_source_files.append(fname)
+                self._chunk_obj_files.append(
+                    os.path.splitext(fname)[0] + objext)
+        if self.incremental_write and self.touched_files:
+            self._remove_cached_files()
+
+    _code_written = False
+
+    def _ensure_written(self):
+        if not self._code_written:
+            self.write_code()
+
+    def fingerprint(self):
+        """
+        Deterministic digest (see :func:`stable_digest`) of what the
+        instance will generate: its inputs (attributes set before
+        ``Generic_Code.__init__`` is called, e.g. expressions and
+        ``DummyGroup``/``ArrayifyGroup`` instances), the class and its
+        attributes (except those listed in ``fingerprint_ignore``)
+        including the code of its methods (e.g. :meth:`variables`, see
+        :func:`stable_digest`), the templates and build files,
+        ``compile_kwargs`` and the identities of compiler and Python
+        interpreter.
+
+        It is stable across sessions and, unlike :meth:`build_cache_key`,
+        computed without generating any code. It is used as cache key
+        when ``lazy`` is set.
+        """
+        files = []
+        for path in self.templates + self.chunk_templates + self.build_files:
+            with open(os.path.join(self.basedir, path), 'rb') as ifh:
+                files.append((path, ifh.read()))
+        return stable_digest(
+            type(self), self._class_attributes(), python_identity(),
+            compiler_identity(self.CompilerRunner or CCompilerRunner),
+            dict((k, v) for k, v in self.compile_kwargs.items()
+                 if k != 'logger'),
+            self._inputs, files)
+
+    fingerprint_ignore = (
+        'build_cache', 'obj_cache', 'registry', 'build_pool', 'jobs',
+        'stream_render', 'incremental_write', 'lazy', 'logger',
+        'phase_hooks')
+
+    def _class_attributes(self):
+        attrs = {}
+        for cls in type(self).__mro__[:-1]:  # skip object
+            for k, v in vars(cls).items():
+                if (k.startswith('__') and not inspect.isfunction(v)) or \
+                   k in attrs or k in self.fingerprint_ignore:
+                    continue
+                attrs[k] = v  # methods are digested by their code
+        return attrs
+
+    def _remove_cached_files(self):
+        for path in self._cached_files:
+            # Make sure we start in a clean state
+            rel_path = os.path.join(self._tempdir, path)
+            if os.path.exists(rel_path):
+                os.unlink(rel_path)
+                self.touched_files.append(rel_path)
+
+    def _render(self, srcpath, outpath, subs):
+        before = _file_signature(outpath)
+        with self._timed('render'):
+            render_mako_template_to(srcpath, outpath, subs,
+                                    only_update=self.incremental_write,
+                                    stream=self.stream_render)
+        if _file_signature(outpath) != before:
+            self.touched_files.append(outpath)
+        self._written_files.append(outpath)
+
+    def _get_module_name(self, subs):
+        base = self.extension_name or os.path.splitext(os.path.basename(
+            (self.obj_files or [self.tempdir_basename])[-1]))[0]
+        if not self.unique_module_name:
+            return base
+        files = []
+        for path in self.templates + self.chunk_templates + self.build_files:
+            with open(os.path.join(self.basedir, path), 'rb') as ifh:
+                files.append((path, ifh.read()))
+        digest = stable_digest(type(self), files, subs)
+        return '{}_{}'.format(base, digest[:12])
+
+    def _get_per_file_kwargs(self):
+        if not self.unique_module_name:
+            return {}
+        return dict((src, _pyx_module_kwargs(self.module_name))
+                    for src in self._get_sources() if src.endswith('.pyx'))
+
+    @property
+    def timings(self):
+        self._flush_timings()
+        return self._timings
+
+    @contextmanager
+    def _timed(self, phase):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - t0
+            self._flush_timings()  # e.g. as_arrayified_code in variables()
+            self._record_phase(phase, seconds)
+
+    def _flush_timings(self):
+        # Phases timed per expression are summed in _pending_timings and
+        # recorded (once per phase) when the enclosing phase ends.
+        pending, self._pending_timings = self._pending_timings, \
+            defaultdict(float)
+        for phase, seconds in pending.items():
+            self._record_phase(phase, seconds)
+
+    def _record_phase(self, phase, seconds):
+        prev = self._timings.get(phase, PhaseTiming(0.0, 0))
+        self._timings[phase] = PhaseTiming(prev.seconds + seconds,
+                                           prev.calls + 1)
+        for hook in self.phase_hooks or ():
+            hook(self, phase, seconds)
+
+    def timing_report(self):
+        """ One line summary of ``timings``.
+
+        Examples
+        --------
+        >>> code = C_Code()
+        >>> code.timings.clear()
+        >>> code.timings['compile'] = PhaseTiming(0.75, 2)
+        >>> code.timing_report()
+        'C_Code timings: compile: 0.75 s (2 calls)'
+
+        """
+        return '{} timings: {}'.format(
+            self.__class__.__name__, ', '.join(
+                '{}: {:.3g} s ({} call{})'.format(
+                    phase, t.seconds, t.calls, '' if t.calls == 1 else 's')
+                for phase, t in self.timings.items()) or 'none')
 
     _mod = None
+    _mod_future = None
+    _executor = None  # ProcessPoolExecutor of a BuildPool during its build
 
     @property
     def mod(self):
         """ Cached compiled binary of the Generic_Code class.
 
-        To clear cache invoke :meth:`clear_mod_cache`.
+        Waits for a build started by :meth:`compile_async` (unless
+        cancelled). To clear cache invoke :meth:`clear_mod_cache`.
         """
         if self._mod is None:
+            if self._mod_future is not None and \
+               not self._mod_future.cancelled():
+                return self._mod_future.result()
             self._mod = self.compile_and_import_binary()
         return self._mod
 
     def clear_mod_cache(self):
         self._mod = None
+        self._mod_future = None
+
+    def compile_async(self, pool=None):
+        """
+        Starts building the binary in the background.
+
+        Parameters
+        ----------
+        pool : BuildPool
+            Default: ``build_pool`` or :func:`default_build_pool`.
+
+        Returns
+        -------
+        concurrent.futures.Future resolving to ``mod`` (already resolved
+        if built). Repeated calls return the same future, a build still
+        queued in the pool may be cancelled using ``Future.cancel()``.
+        """
+        if self._mod is not None and self._mod_future is None:
+            self._mod_future = Future()
+            self._mod_future.set_result(self._mod)
+        if self._mod_future is None or self._mod_future.cancelled():
+            pool = pool or self.build_pool or default_build_pool()
+            self._mod_future = pool.submit(self)
+        return self._mod_future
+
+    def compile_asyncio(self, pool=None):
+        """
+        Awaitable variant of :meth:`compile_async`, to be called from
+        a coroutine (cancelling the awaitable cancels a queued build).
+        """
+        return asyncio.wrap_future(self.compile_async(pool))
+
+    def _compile_with(self, executor):
+        self._executor = executor
+        try:
+            self._compile()
+        finally:
+            self._executor = None
+
+    def _build_in_pool(self, executor):
+        self._executor = executor
+        try:
+            self._mod = self.compile_and_import_binary()
+        finally:
+            self._executor = None
+        return self._mod
 
     def compile_and_import_binary(self):
         """
         Returnes a module instance of the extension module.
         Consider using the `mod` property instead.
 
-        Do ::
         >>> mod = codeinstnc.compile_and_import_binary()  # doctest: +SKIP
         >>> x = mod.cb('foo') # doctest: +SKIP
 
-        Don't ::
-        >>> cb = codeinstnc.compile_and_import_binary().cb  # doctest: +SKIP
+        Each binary is imported under a unique name (see
+        :class:`Interceptor`), so keeping a function is safe also when
+        several versions of the same extension module have been
+        compiled::
 
-        Since that circumvents measurments avoiding singleton
-        behaviour when multiple different versions of the same
-        extension module have been compiled. (the shared object
-        has the same name and identifier)
+        >>> cb = codeinstnc.compile_and_import_binary().cb  # doctest: +SKIP
         """
-        self._compile()
+        mod, key = self._fetch_built()
+        if mod is None:
+            self._ensure_written()
+            self._compile()
+            mod = self._import_built(key, store=True)
+        return mod
+
+    def _fetch_built(self):
+        # Returns the module of a registered build or one fetched from the
+        # build cache (or None) and the key used for both (None when
+        # neither is set), computed prior to building.
+        registry, cache = self.registry, self._get_build_cache()
+        if registry is None and cache is None:
+            return None, None
+        key = self._cache_key()
+        mod = None if registry is None else registry.get(key)
+        if mod is None and cache is not None and \
+           self._fetch_from_build_cache(cache, key):
+            mod = self._import_built(key)
+        return mod, key
+
+    def _import_built(self, key, store=False):
+        # Imports the binary, stores it in the build cache (if ``store``)
+        # and registers it under ``key`` (see _fetch_built).
+        cache = self._get_build_cache()
+        if store and cache is not None:
+            cache.put(key, [self.binary_path])
+        with self._timed('import'):
+            mod = self._import_binary()
+        if self.registry is not None:
+            self.registry.add(key, self, mod)
+        if self.logger:
+            self.logger.info(self.timing_report())
+        return mod
+
+    def _cache_key(self):
+        return self.fingerprint() if self.lazy else self.build_cache_key()
+
+    def _import_binary(self):
+        if self.binding == 'ctypes':
+            return CtypesModule(self.binary_path, self.ctypes_signatures)
         return Interceptor(self.binary_path)
 
+    def _get_build_cache(self):
+        if self.build_cache is True:
+            self.build_cache = BuildCache(logger=self.logger)
+        return self.build_cache or None
+
+    def _get_obj_cache(self):
+        if self.obj_cache is True:
+            self.obj_cache = BuildCache(os.path.join(
+                default_cache_dir(), 'objects'), logger=self.logger)
+        return self.obj_cache or None
+
+    def _static_sources(self):
+        rendered = set(os.path.basename(x).replace('_template', '')
+                       for x in self.templates)
+        return [src for src in self._get_sources() if src not in rendered and
+                src in set(map(os.path.basename, self.build_files))]
+
+    def obj_cache_key(self, src):
+        """ Digest of everything determining the object of a static source. """
+        parts = [src, python_identity(),
+                 compiler_identity(self.CompilerRunner or CCompilerRunner),
+                 sorted((k, v) for k, v in self.compile_kwargs.items()
+                        if k != 'logger'),
+                 sorted(self._get_per_file_kwargs().get(src, {}).items())]
+        if src.endswith('.pyx'):
+            import Cython
+            parts.append(Cython.__version__)
+        for path in sorted(self.build_files):
+            with open(os.path.join(self._tempdir, os.path.basename(path)),
+                      'rb') as ifh:
+                parts.extend([os.path.basename(path), ifh.read()])
+        return BuildCache.key(*parts)
+
+    def _fetch_static_objs(self, cache, sources):
+        # Returns sources left to compile and [(obj, key)] to store
+        static = set(self._static_sources())
+        remaining, to_store = [], []
+        for src in sources:
+            if src not in static:
+                remaining.append(src)
+                continue
+            obj = os.path.splitext(src)[0] + objext
+            key = self.obj_cache_key(src)
+            entry = cache.get(key)
+            if entry is not None:
+                try:
+                    shutil.copy2(os.path.join(entry, obj), self._tempdir)
+                    continue
+                except OSError:
+                    pass  # evicted by other process in the meantime
+            remaining.append(src)
+            to_store.append((obj, key))
+        return remaining, to_store
+
+    def build_cache_key(self):
+        """
+        Digest of everything determining the linked binary: the
+        written (rendered/copied) files, names of sources and objects,
+        content of prebuilt objects (those not compiled from sources),
+        ``compile_kwargs`` and the identity of compiler and Python
+        interpreter. It is unaffected by building the instance.
+        """
+        self._ensure_written()
+        so_file = None if self._so_file_derived else self.so_file
+        parts = [self.__class__.__name__, self.fort, so_file,
+                 self.extension_name, self.binding,
+                 self._get_sources(), self._get_objects(), python_identity(),
+                 compiler_identity(self.CompilerRunner or CCompilerRunner),
+                 sorted((k, v) for k, v in self.compile_kwargs.items()
+                        if k != 'logger')]
+        if any(src.endswith('.pyx') for src in self._get_sources()):
+            import Cython
+            parts.append(Cython.__version__)
+        for path in sorted(set(self._written_files)):
+            with open(path, 'rb') as ifh:
+                parts.extend([os.path.basename(path), ifh.read()])
+        compiled = set(os.path.splitext(os.path.basename(src))[0] + objext
+                       for src in self._get_sources())
+        for obj in self.obj_files:
+            path = os.path.join(self._tempdir, obj)
+            if obj not in compiled and os.path.exists(path):
+                with open(path, 'rb') as ifh:
+                    parts.extend([obj, ifh.read()])
+        return BuildCache.key(*parts)
+
+    def _fetch_from_build_cache(self, cache, key):
+        entry = cache.get(key)
+        if entry is None:
+            return False
+        try:
+            fname, = os.listdir(entry)
+            # new inode: a loaded binary at the destination is not modified
+            tmp = os.path.join(self._tempdir, '.' + fname)
+            shutil.copy2(os.path.join(entry, fname), tmp)
+            os.replace(tmp, os.path.join(self._tempdir, fname))
+        except (OSError, ValueError):
+            return False  # (being) evicted by other process in the meantime
+        self._set_derived_so_file(fname)
+        return True
+
+    _so_file_derived = False
+
+    def _set_derived_so_file(self, path):
+        # Unless so_file is given it is named by linking (an input of
+        # build_cache_key only in the former case)
+        if self.so_file is None or self._so_file_derived:
+            self.so_file = os.path.basename(path)
+            self._so_file_derived = True
+
     @property
     def binary_path(self):
         return os.path.join(self._tempdir, self.so_file)
@@ -340,6 +1448,7 @@ class Generic_Code(object):
                 map(os.unlink, self._written_files)
             if getattr(self, '_remove_tempdir_on_clean', False):
                 shutil.rmtree(self._tempdir)
+                self._remove_tempdir_on_clean = False  # e.g. in __del__
 
     def __del__(self):
         """
@@ -349,56 +1458,97 @@ class Generic_Code(object):
         self.clean()
 
     def _compile(self):
-        self._compile_obj()
-        self._compile_so()
+        with self._timed('compile'):
+            self._compile_obj()
+        with self._timed('link'):
+            self._compile_so()
+
+    def _get_compile_kwargs(self):
+        # pycompilation appends to e.g. include_dirs/libraries inplace
+        return dict((k, list(v) if isinstance(v, (list, tuple)) else v)
+                    for k, v in self.compile_kwargs.items())
+
+    def _get_sources(self):
+        sources = self._chunk_source_files + self.source_files
+        if self.binding == 'ctypes':
+            sources = [src for src in sources if not src.endswith('.pyx')]
+        return sources
+
+    def _get_objects(self):
+        objs = self._chunk_obj_files + self.obj_files
+        if self.binding == 'ctypes':
+            pyx = set(os.path.splitext(src)[0] for src in self.source_files
+                      if src.endswith('.pyx'))
+            objs = [obj for obj in objs if os.path.splitext(obj)[0] not in pyx]
+        return objs
 
     def _compile_obj(self, sources=None):
-        sources = sources or self.source_files
-        compile_sources(sources, self.CompilerRunner,
-                        cwd=self._tempdir,
-                        logger=self.logger,
-                        **self.compile_kwargs)
+        sources = sources or self._get_sources()
+        cache = self._get_obj_cache()
+        if cache is not None:
+            sources, to_store = self._fetch_static_objs(cache, sources)
+            if not sources:
+                return
+        if self._executor is None and (self.jobs == 1 or len(sources) < 2):
+            compile_sources(sources, self.CompilerRunner,
+                            cwd=self._tempdir,
+                            per_file_kwargs=self._get_per_file_kwargs(),
+                            logger=self.logger,
+                            **self._get_compile_kwargs())
+        else:
+            compile_sources_parallel(sources, self.CompilerRunner,
+                                     cwd=self._tempdir, jobs=self.jobs,
+                                     logger=self.logger,
+                                     executor=self._executor,
+                                     per_file_kwargs=self._get_per_file_kwargs(),
+                                     **self._get_compile_kwargs())
+        if cache is not None:
+            for obj, key in to_store:
+                cache.put(key, [os.path.join(self._tempdir, obj)])
 
     def _compile_so(self):
-        so_file = link_py_so(self.obj_files,
-                             so_file=self.so_file,
-                             cwd=self._tempdir,
-                             fort=self.fort,
-                             logger=self.logger,
-                             **self.compile_kwargs)
-        self.so_file = self.so_file or so_file
+        if self.binding == 'ctypes':
+            so_file = link(self._get_objects(), out_file=self.so_file,
+                           shared=True, cwd=self._tempdir, fort=self.fort,
+                           logger=self.logger, **self._get_compile_kwargs())
+        else:
+            # link_py_so does not pass so_file on, out_file does reach link
+            so_file = link_py_so(self._get_objects(),
+                                 out_file=self.so_file,
+                                 cwd=self._tempdir,
+                                 fort=self.fort,
+                                 logger=self.logger,
+                                 **self._get_compile_kwargs())
+        self._set_derived_so_file(so_file)
 
 
 class Cython_Code(Generic_Code):
     """
-    Uses Cython's build_ext and distutils
-    to simplify compilation
-
-    Could be rewritten to use pyx2obj
+    Cythonizes, compiles and links ``source_files`` (``.pyx`` and
+    e.g. ``.c``, template names are mapped to rendered names) into the
+    extension module ``extension_name`` (objects default to one per
+    source). Include/library directories and libraries are taken from
+    ``compile_kwargs``.
     """
 
-    def _compile(self):
-        from Cython.Distutils import build_ext
-        from setuptools import setup
-        from setuptools import Extension
-
-        sources = [os.path.join(
-            self._tempdir, os.path.basename(x).replace(
-                '_template', '')) for x in self.source_files]
-        setup(
-            script_name='DUMMY_SCRIPT_NAME',
-            script_args=['build_ext',  '--build-lib', self._tempdir],
-            include_dirs=self._include_dirs,
-            cmdclass={'build_ext': build_ext},
-            ext_modules=[
-                Extension(
-                    self.extension_name,
-                    sources,
-                    libraries=self._libraries,
-                    library_dirs=self._library_dirs,
-                    include_dirs=self._include_dirs),
-                ]
-            )
+    def _get_sources(self):
+        return [os.path.basename(x).replace('_template', '')
+                for x in super(Cython_Code, self)._get_sources()]
+
+    def _get_objects(self):
+        if self.obj_files:
+            return super(Cython_Code, self)._get_objects()
+        return [os.path.splitext(src)[0] + objext
+                for src in self._get_sources()]
+
+    def _get_per_file_kwargs(self):
+        return dict((src, _pyx_module_kwargs(self.module_name))
+                    for src in self._get_sources() if src.endswith('.pyx'))
+
+    def _compile_so(self):
+        if self.so_file is None:
+            self._set_derived_so_file(self.module_name + sharedext)
+        super(Cython_Code, self)._compile_so()
 
 
 class C_Code(Generic_Code):
@@ -436,7 +1586,7 @@ class F90_Code(Generic_Code):
         # self._cached_files += [
         #  x+'.mod' for x in self._get_module_files(self.source_files)]
         self._cached_files += [
-            x+'.mod' for x in self._get_module_files(self.templates)]
+            x+'.mod' for x in self._get_module_files(self.templates or [])]
         super(F90_Code, self).__init__(*args, **kwargs)
 
     def _get_module_files(self, files):
@@ -451,6 +1601,174 @@ class F90_Code(Generic_Code):
         return names
 
 
+def _unit_key(code, src):
+    # Identifies the object file compiled from ``src`` in code._tempdir:
+    # its content, other (non-source) files it may include, compiler
+    # and options.
+    sources = set(code._get_sources())
+    parts = [src, compiler_identity(code.CompilerRunner or CCompilerRunner),
+             sorted((k, v) for k, v in code.compile_kwargs.items()
+                    if k != 'logger'),
+             sorted(code._get_per_file_kwargs().get(src, {}).items())]
+    for path in [os.path.join(code._tempdir, src)] + sorted(
+            set(f for f in code._written_files
+                if os.path.basename(f) not in sources)):
+        with open(path, 'rb') as ifh:
+            parts.extend([os.path.basename(path), ifh.read()])
+    return BuildCache.key(*parts)
+
+
+def build_codes(codes, jobs=None, logger=None):
+    """ Builds many :class:`Generic_Code` instances using shared workers.
+
+    Instances with identical builds (see :meth:`Generic_Code.build_cache_key`)
+    are only built once, and so are identical translation units (e.g. a
+    wrapper shared between instances). All translation units are compiled
+    in one pool of worker processes, after which the instances are linked
+    concurrently. Instances overriding ``_compile`` (e.g. ``Cython_Code``)
+    are built as a whole using the same pool. Objects of static sources
+    are fetched from (and stored in) ``obj_cache`` when set, builds are
+    looked up in (and stored in) ``build_cache`` and ``registry`` as by
+    :meth:`Generic_Code.compile_and_import_binary`. Compilation
+    of a shared translation unit is recorded in ``timings`` of the first
+    instance using it.
+
+    Parameters
+    ----------
+    codes : iterable of Generic_Code instances
+    jobs : int
+        Number of worker processes (default: number of cores).
+    logger : logging.Logger
+        Progress, per unit timings and failures are reported here.
+
+    Returns
+    -------
+    List of module proxies (``mod`` of each instance).
+
+    Notes
+    -----
+    All instances are processed even if some fail, after which the
+    exception of the first failing instance is raised.
+    """
+    codes = list(codes)
+    errors = {}
+    builds = OrderedDict()  # build key -> instances
+    keys = {}  # id(code) -> registry/build cache key (prior to building)
+    for code in codes:
+        if code._mod is not None:
+            continue
+        code._mod, keys[id(code)] = code._fetch_built()
+        if code._mod is not None:
+            continue
+        code._ensure_written()
+        builds.setdefault(code.build_cache_key(), []).append(code)
+
+    units = OrderedDict()  # unit key -> (code, src)
+    code_units = {}  # build key -> [unit key]
+    custom = []
+    for key, (code, *_) in builds.items():
+        if type(code)._compile is not Generic_Code._compile:
+            custom.append(key)
+            continue
+        code_units[key] = []
+        for src in code._get_sources():
+            ukey = _unit_key(code, src)
+            code_units[key].append(ukey)
+            units.setdefault(ukey, (code, src))
+
+    def link_build(key):
+        first = builds[key][0]
+        for ukey in code_units[key]:
+            obj = unit_objs[ukey]
+            if os.path.dirname(obj) != os.path.abspath(first._tempdir):
+                shutil.copy2(obj, first._tempdir)
+        with first._timed('link'):
+            first._compile_so()
+
+    def finish_build(key):
+        first = builds[key][0]
+        for code in builds[key]:
+            ckey = keys[id(code)]
+            if code.registry is not None:
+                code._mod = code.registry.get(ckey)  # e.g. identical build
+            if code._mod is None:
+                if code is not first:
+                    shutil.copy2(first.binary_path, code._tempdir)
+                    code._set_derived_so_file(first.so_file)
+                code._mod = code._import_built(ckey, store=True)
+
+    with _process_pool(jobs or os.cpu_count()) as executor, \
+            ThreadPoolExecutor(jobs or os.cpu_count()) as threads:
+        custom_futures = dict((threads.submit(
+            builds[key][0]._compile_with, executor), key) for key in custom)
+        unit_futures, unit_objs, unit_stores = {}, {}, {}
+        for ukey, (code, src) in units.items():
+            obj_cache = code._get_obj_cache()
+            if obj_cache is not None and src in code._static_sources():
+                remaining, to_store = code._fetch_static_objs(obj_cache, [src])
+                if not remaining:
+                    unit_objs[ukey] = os.path.join(os.path.abspath(
+                        code._tempdir), os.path.splitext(src)[0] + objext)
+                    continue
+                unit_stores[ukey] = (obj_cache, to_store[0][1])
+            kwargs = dict(code._get_compile_kwargs(), logger=logger,
+                          **code._get_per_file_kwargs().get(src, {}))
+            _prime_compilers([src], code.CompilerRunner, code._tempdir, kwargs)
+            unit_futures[executor.submit(
+                _timed_compile_source, src, code.CompilerRunner,
+                os.path.abspath(code._tempdir), kwargs)] = ukey
+        if logger:
+            logger.info("Building {} instances ({} unique builds, {} unique "
+                        "translation units, {} cached)".format(
+                            len(codes), len(builds), len(units),
+                            len(unit_objs)))
+        failed_units = {}
+        for i, fut in enumerate(as_completed(unit_futures), 1):
+            ukey = unit_futures[fut]
+            code, src = units[ukey]
+            if fut.exception() is None:
+                obj, dt = fut.result()
+                code._record_phase('compile', dt)
+                unit_objs[ukey] = os.path.join(
+                    os.path.abspath(code._tempdir), os.path.basename(obj))
+                if ukey in unit_stores:
+                    obj_cache, okey = unit_stores[ukey]
+                    obj_cache.put(okey, [unit_objs[ukey]])
+                if logger:
+                    logger.info("[{}/{}] Compiled {} ({}) in {:.3f} s".format(
+                        i, len(unit_futures), src, code.__class__.__name__,
+                        dt))
+            else:
+                failed_units[ukey] = fut.exception()
+                if logger:
+                    logger.error("[{}/{}] Compilation of {} ({}) failed: "
+                                 "{}".format(i, len(unit_futures), src,
+                                             code.__class__.__name__,
+                                             fut.exception()))
+        link_futures = {}
+        for key, ukeys in code_units.items():
+            failed = [failed_units[uk] for uk in ukeys if uk in failed_units]
+            if failed:
+                errors[key] = failed[0]
+            else:
+                link_futures[threads.submit(link_build, key)] = key
+        for fut in as_completed(list(link_futures) + list(custom_futures)):
+            key = link_futures.get(fut) or custom_futures[fut]
+            if fut.exception() is not None:
+                errors[key] = fut.exception()
+                if logger:
+                    logger.error("Building {} failed: {}".format(
+                        builds[key][0].__class__.__name__, fut.exception()))
+                continue
+            try:
+                finish_build(key)
+            except Exception as exc:
+                errors[key] = exc
+    if errors:
+        raise errors[next(k for k in builds if k in errors)]
+    return [code.mod for code in codes]
+
+
 def make_PCEExtension_for_prebuilding_Code(
         name, Code, prebuild_sources, srcdir,
         downloads=None, **kwargs):
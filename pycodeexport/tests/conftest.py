@@ -0,0 +1,36 @@
+import os
+
+import pytest
+
+from pycodeexport.codeexport import C_Code
+
+
+_value_template = 'double value(void){ return ${value}; }\n'
+
+
+def _mk_ValueCode(basedir, value, Base=C_Code, template=_value_template,
+                  **attrs):
+    """ Subclass of ``Base`` whose variables() (a closure) gives
+    ``{'value': value}``. Unless ``template`` is None it is written to
+    ``basedir`` and rendered into a ctypes library, ``attrs`` are set as
+    class attributes. """
+    class ValueCode(Base):
+        def variables(self):
+            return {'value': value}
+
+    if template is not None:
+        with open(os.path.join(str(basedir), 'value_template.c'), 'wt') as ofh:
+            ofh.write(template)
+        attrs = dict(dict(templates=['value_template.c'],
+                          source_files=['value.c'], obj_files=['value.o'],
+                          binding='ctypes'), **attrs)
+    if basedir is not None:
+        attrs['basedir'] = str(basedir)
+    for k, v in attrs.items():
+        setattr(ValueCode, k, v)
+    return ValueCode
+
+
+@pytest.fixture
+def mk_ValueCode():
+    return _mk_ValueCode
@@ -0,0 +1,159 @@
+import ctypes
+import os
+
+from pycodeexport.cache import BuildCache
+from pycodeexport.codeexport import BuildRegistry, C_Code, build_codes
+
+
+_answer_template = r"""
+#include <Python.h>
+
+static PyObject * answer(PyObject *self, PyObject *args){
+    return PyFloat_FromDouble(${value});
+}
+
+static PyMethodDef methods[] = {
+    {"answer", answer, METH_NOARGS, NULL}, {NULL, NULL, 0, NULL}
+};
+
+static struct PyModuleDef moddef = {
+    PyModuleDef_HEAD_INIT, "answer", NULL, -1, methods
+};
+
+PyMODINIT_FUNC PyInit_answer(void){ return PyModule_Create(&moddef); }
+"""
+
+
+def _mk_AnswerCode(basedir, value, cache):
+    with open(os.path.join(basedir, 'answer_template.c'), 'wt') as ofh:
+        ofh.write(_answer_template)
+
+    class AnswerCode(C_Code):
+        templates = ['answer_template.c']
+        source_files = ['answer.c']
+        obj_files = ['answer.o']
+        compile_kwargs = {'inc_py': True, 'std': 'c99'}
+        build_cache = cache
+
+        def variables(self):
+            return {'value': value}
+
+    AnswerCode.basedir = basedir
+    return AnswerCode
+
+
+def test_BuildCache(tmpdir):
+    cache = BuildCache(str(tmpdir.join('cache')), max_size=10)
+    src = tmpdir.join('a.txt')
+    src.write('12345678')
+    k1, k2 = cache.key('a'), cache.key('b')
+    assert k1 != k2 and k1 == cache.key('a')
+    assert cache.get(k1) is None
+    entry = cache.put(k1, [str(src)])
+    assert cache.get(k1) == entry
+    assert open(os.path.join(entry, 'a.txt')).read() == '12345678'
+    cache.put(k2, [str(src)])  # exceeds max_size, k1 is least recently used
+    assert cache.get(k1) is None
+    assert cache.get(k2) is not None
+    assert cache.stats == {'hits': 2, 'misses': 2, 'stores': 2, 'evictions': 1}
+    cache.clear()
+    assert cache.size == 0 and cache.stats['stores'] == 0
+
+
+def test_Generic_Code_build_cache(tmpdir):
+    cache = BuildCache(str(tmpdir.join('cache')))
+    Code1 = _mk_AnswerCode(str(tmpdir), 42.0, cache)
+    code = Code1()
+    key = code.build_cache_key()
+    assert code.mod.answer() == 42.0
+    assert cache.stats['misses'] == 1
+    assert code.build_cache_key() == key  # unaffected by building
+    code.clear_mod_cache()
+    assert code.mod.answer() == 42.0
+    assert cache.stats == {'hits': 1, 'misses': 1, 'stores': 1, 'evictions': 0}
+    assert Code1().mod.answer() == 42.0
+    assert cache.stats['hits'] == 2
+
+    code = Code1()
+    entry = cache.get(code.build_cache_key())
+    for fname in os.listdir(entry):  # as if in the middle of eviction
+        os.unlink(os.path.join(entry, fname))
+    assert not code._fetch_from_build_cache(cache, code.build_cache_key())
+
+    Code2 = _mk_AnswerCode(str(tmpdir), 17.0, cache)
+    assert Code2().mod.answer() == 17.0
+    assert cache.stats == {'hits': 4, 'misses': 2, 'stores': 2, 'evictions': 0}
+
+
+def test_build_codes_build_cache(tmpdir):
+    cache = BuildCache(str(tmpdir.join('cache')))
+    Code = _mk_AnswerCode(str(tmpdir), 42.0, cache)
+    Code.registry = BuildRegistry()
+    code1, code2 = Code(), Code()
+    mod1, mod2 = build_codes([code1, code2])
+    assert mod1 is mod2 and len(Code.registry) == 1  # registered once
+    assert cache.stats['stores'] == 1
+    Code.registry = None
+    assert Code().mod.answer() == 42.0  # key of build_codes
+    assert cache.stats['hits'] == 1
+    assert build_codes([Code()])[0].answer() == 42.0
+    assert cache.stats == {'hits': 2, 'misses': 2, 'stores': 1, 'evictions': 0}
+
+
+def test_build_codes_relative_tempdir(tmpdir, monkeypatch):
+    monkeypatch.chdir(tmpdir)
+    Code = _mk_AnswerCode(str(tmpdir), 42.0, None)
+    assert build_codes([Code(tempdir='build')])[0].answer() == 42.0
+
+
+def test_Generic_Code_obj_cache(tmpdir, mk_ValueCode):
+    cache = BuildCache(str(tmpdir.join('objects')))
+    tmpdir.join('support.c').write('int support(void){ return 7; }\n')
+
+    def mk_Code(value):
+        return mk_ValueCode(
+            tmpdir, value, build_files=['support.c'],
+            source_files=['support.c', 'value.c'],
+            obj_files=['support.o', 'value.o'], obj_cache=cache)()
+
+    code1 = mk_Code(42.0)
+    assert code1._static_sources() == ['support.c']
+    assert code1.mod.support() == 7
+    assert cache.stats == {'hits': 0, 'misses': 1, 'stores': 1, 'evictions': 0}
+    code2 = mk_Code(17.0)
+    assert code2.mod.support() == 7
+    assert cache.stats['hits'] == 1 and cache.stats['stores'] == 1
+    code3 = mk_Code(3.0)
+    assert build_codes([code3])[0].support() == 7
+    assert cache.stats['hits'] == 2
+
+
+def test_Generic_Code_lazy(tmpdir, mk_ValueCode):
+    cache = BuildCache(str(tmpdir.join('cache')))
+    calls = []
+
+    def mk_Code(value, **attrs):  # variables() depends on a closure only
+        return mk_ValueCode(tmpdir, value, build_cache=cache, lazy=True,
+                            **attrs)()
+
+    # not part of fingerprint (unlike e.g. closures of variables)
+    hooks = [lambda code, phase, dt: calls.append(
+        code.variables()['value']) if phase == 'variables' else None]
+    code = mk_Code(42.0, phase_hooks=hooks)
+    assert calls == [] and not os.listdir(code._tempdir)
+    assert code.fingerprint() == mk_Code(42.0).fingerprint()
+    assert code.fingerprint() != mk_Code(17.0).fingerprint()
+    code.mod.value.restype = ctypes.c_double
+    assert code.mod.value() == 42.0 and calls == [42.0]
+
+    code2 = mk_Code(42.0, phase_hooks=hooks)
+    code2.mod.value.restype = ctypes.c_double
+    assert code2.mod.value() == 42.0 and len(calls) == 1  # no code generation
+    assert cache.stats['hits'] == 1
+
+    registry = BuildRegistry()
+    for value in (3.0, 5.0, 3.0):
+        code = mk_Code(value, registry=registry)
+        code.mod.value.restype = ctypes.c_double
+        assert code.mod.value() == value
+    assert len(registry) == 2
@@ -1,4 +1,16 @@
-from pycodeexport.codeexport import syntaxify_getitem
+import os
+
+import pytest
+import sympy
+from pycompilation.compilation import sharedext
+from pycompilation.util import CompilationError
+
+from pycodeexport.cache import BuildCache
+from pycodeexport.codeexport import (
+    syntaxify_getitem, compile_sources_parallel, build_codes, C_Code,
+    Cython_Code, F90_Code, DummyGroup, ArrayifyGroup, BuildPool, BuildRegistry,
+    compile_arrayify_groups, _dummify_expr
+)
 
 
 def test_syntaxify_getitem():
@@ -12,3 +24,549 @@ def test_syntaxify_getitem():
 
     s3 = syntaxify_getitem('C', 'dummy12 = alpha + beta;', 'dummy', 'output')
     assert s3 == 'output[12] = alpha + beta;'
+
+
+def test_compile_sources_parallel(tmpdir):
+    for name, body in [('a', 'int a(void){ return 1; }'),
+                       ('b', 'int b(void){ return 2; }'),
+                       ('c', 'int c(void){ return syntax error; }'),
+                       ('d', 'int d(void){ return also wrong; }')]:
+        tmpdir.join(name + '.c').write(body)
+    objs = compile_sources_parallel(['a.c', 'b.c'], cwd=str(tmpdir), jobs=2)
+    assert [os.path.basename(o) for o in objs] == ['a.o', 'b.o']
+    assert all(tmpdir.join(o).check() for o in ('a.o', 'b.o'))
+    with pytest.raises(CompilationError) as excinfo:
+        compile_sources_parallel(['a.c', 'd.c', 'c.c'], cwd=str(tmpdir))
+    assert 'd.c' in str(excinfo.value)
+
+
+_chunked_template = r"""
+#include <Python.h>
+%for idx in range(len(chunks)):
+void chunk_${idx}(const double * const, double * const, double * const);
+%endfor
+
+static PyObject * evaluate(PyObject *self, PyObject *args){
+    double x[${nx}], out[${nout}], cse_scratch[${ncse} + 1];
+    PyObject *inp, *res;
+    if (!PyArg_ParseTuple(args, "O", &inp)) return NULL;
+    for (int i=0; i<${nx}; ++i) x[i] = PyFloat_AsDouble(PyList_GetItem(inp, i));
+%for idx in range(len(chunks)):
+    chunk_${idx}(x, cse_scratch, out);
+%endfor
+    res = PyList_New(${nout});
+    for (int i=0; i<${nout}; ++i) PyList_SetItem(res, i, PyFloat_FromDouble(out[i]));
+    return res;
+}
+
+static PyMethodDef methods[] = {
+    {"evaluate", evaluate, METH_VARARGS, NULL}, {NULL, NULL, 0, NULL}
+};
+
+static struct PyModuleDef moddef = {
+    PyModuleDef_HEAD_INIT, "chunked", NULL, -1, methods
+};
+
+PyMODINIT_FUNC PyInit_chunked(void){ return PyModule_Create(&moddef); }
+"""
+
+_chunk_template = r"""
+#include <math.h>
+void chunk_${chunk_index}(const double * const x, double * const cse_scratch,
+                          double * const out){
+%for lhs, rhs in chunk.defs:
+    ${lhs} = ${rhs};
+%endfor
+%for idx, code in chunk.exprs:
+    out[${idx}] = ${code};
+%endfor
+}
+"""
+
+
+def test_Generic_Code_chunks(tmpdir):
+    tmpdir.join('chunked_template.c').write(_chunked_template)
+    tmpdir.join('chunk_template.c').write(_chunk_template)
+    x = sympy.symbols('x:3')
+    exprs = [(x[0] + x[1])**2 + sympy.sin(x[0] + x[1]),
+             (x[0] + x[1])**2 * x[2],
+             sympy.exp(x[2]*(x[0] + x[1])) + sympy.sin(x[0] + x[1]),
+             x[2]**3 - sympy.exp(x[2]*(x[0] + x[1]))]
+
+    class ChunkedCode(C_Code):
+        basedir = str(tmpdir)
+        templates = ['chunked_template.c']
+        chunk_templates = ['chunk_template.c']
+        source_files = ['chunked.c']
+        obj_files = ['chunked.o']
+        compile_kwargs = {'inc_py': True, 'std': 'c99'}
+        jobs = 2
+
+        def variables(self):
+            ncse, chunks = self.get_cse_code_chunks(
+                exprs, nchunks=3, dummy_groups=[DummyGroup('x', x)],
+                arrayify_groups=[ArrayifyGroup('x', 'x')])
+            return {'nx': len(x), 'nout': len(exprs), 'ncse': ncse,
+                    'chunks': chunks}
+
+    code = ChunkedCode()
+    assert code._chunk_source_files == ['chunk_0.c', 'chunk_1.c', 'chunk_2.c']
+    inp = [0.3, 0.5, 0.7]
+    ref = [float(e.subs(dict(zip(x, inp)))) for e in exprs]
+    assert all(abs(a - b) < 1e-14 for a, b in zip(code.mod.evaluate(inp), ref))
+
+
+@pytest.mark.parametrize('kwargs', [{'nchunks': 3}, {'max_statements': 2}])
+def test_Generic_Code_get_cse_code_chunks_empty(tmpdir, kwargs):
+    code = C_Code(tempdir=str(tmpdir))
+    assert code.get_cse_code_chunks([], **kwargs) == (0, [([], [])])
+
+
+def test_Generic_Code_get_cse_code(tmpdir):
+    class Code(C_Code):
+        pass
+    code = Code(tempdir=str(tmpdir))
+    y = sympy.symbols('y:2')
+    exprs = [sympy.exp(y[0]+y[1])*y[0], sympy.exp(y[0]+y[1])*y[1]]
+    for order in ('canonical', 'none'):
+        defs, exprs_code = code.get_cse_code(
+            exprs, dummy_groups=[DummyGroup('ydummy', y[::-1])],
+            arrayify_groups=[ArrayifyGroup('ydummy', 'y')], order=order)
+        assert [(str(k), v) for k, v in defs] == [('cse0', 'exp(y[0] + y[1])')]
+        assert sorted(exprs_code) == ['cse0*y[0]', 'cse0*y[1]']
+    assert set(code.cse_timings) == {'dummify', 'cse', 'print', 'arrayify'}
+
+
+def test__dummify_expr():
+    x0, x1 = sympy.symbols('x0 x1')
+    assert _dummify_expr(x0 + 2*x1, 'x', [x1, x0]) == x1 + 2*x0
+
+
+@pytest.mark.parametrize('Base', [C_Code, F90_Code])
+def test_Generic_Code_as_arrayified_code_dummify(Base, tmpdir):
+    class Code(Base):
+        pass
+    code = Code(tempdir=str(tmpdir))
+    a, b = sympy.symbols('a b')
+    f = sympy.Function('f')(a)
+    expr = sympy.exp(a)*b + f**2
+    dg = [DummyGroup('dmy', [f, a]), DummyGroup('other', [b])]
+    ag = [ArrayifyGroup('dmy', 'y'), ArrayifyGroup('other', 'z', 3)]
+    ref = code.as_arrayified_code(expr, dg, ag)
+    assert 'z(' in ref if Base is F90_Code else 'z[0+3]' in ref
+    printed = code.as_arrayified_code(expr, dg, ag, dummify=False)
+    assert sorted(ref.split(' + ')) == sorted(printed.split(' + '))
+    assert len(code._dummy_mappings) == 1
+
+
+@pytest.mark.parametrize('Base', [C_Code, F90_Code])
+def test_Generic_Code_arrayify_mode_printer(Base, tmpdir):
+    class Code(Base):
+        arrayify_mode = 'printer'
+    code = Code(tempdir=str(tmpdir))
+    y = sympy.symbols('y:12')
+    yy = sympy.Symbol('yy1')  # would be mangled by regex arrayification
+    dg = [DummyGroup('y', y)]
+    ag = [ArrayifyGroup('y', 'yout', 1, -1 if Base is F90_Code else 0)]
+    printed = code.as_arrayified_code(y[11]*y[1] + yy, dg, ag)
+    regex = code.as_arrayified_code(y[11]*y[1], dg, ag, arrayify_mode='regex')
+    fmt = '{}(11+1,:)' if Base is F90_Code else '{}[11+1]'
+    assert fmt.format('yout') in printed and 'yy1' in printed
+    assert sorted(printed.split(' + ')) == sorted((regex + ' + yy1').split(' + '))
+
+    defs, exprs = code.get_cse_code(
+        [sympy.exp(y[0] + y[1]), y[2]*sympy.exp(y[0] + y[1])], dummy_groups=dg,
+        arrayify_groups=ag + [ArrayifyGroup('cse', 'scratch')])
+    assert exprs[1] in ('scratch[0]*yout[2+1]', 'scratch(0)*yout(2+1,:)')
+
+
+def test_compile_arrayify_groups():
+    arrayify = compile_arrayify_groups('F', [
+        ArrayifyGroup('y', 'x', -1), ArrayifyGroup('x', 'out'),
+        ArrayifyGroup('yy', 'w', None, 1)])
+    assert arrayify('x2 = y1 + yy7') == 'out(2) = x(1-1) + w(:,7)'
+    assert arrayify('max(xy1, x_y2, max3)') == 'max(xy1, x_y2, max3)'
+
+
+def test_Generic_Code_openmp(tmpdir):
+    class Code(F90_Code):
+        openmp = True
+        omp_schedule = 'dynamic'
+        compile_kwargs = {'options': ['fast']}
+    code = Code(tempdir=str(tmpdir))
+    assert code.compile_kwargs['options'] == ['fast', 'openmp']
+    assert Code.compile_kwargs['options'] == ['fast']
+    assert code.omp_parallel_for(num_threads='n', clauses='private(x)') == (
+        '!$omp parallel do schedule(dynamic) num_threads(n) private(x)')
+    assert code.omp_end_parallel_for() == '!$omp end parallel do'
+
+    class SerialCode(C_Code):
+        pass
+    serial = SerialCode(tempdir=str(tmpdir))
+    assert 'options' not in serial.compile_kwargs
+    assert serial.omp_parallel_for() == serial.omp_end_parallel_for() == ''
+
+
+_ctypes_template = r"""
+#include <math.h>
+int evaluate(const int n, const double * const x, double * const out){
+%for i, code in enumerate(exprs):
+    out[${i}] = ${code};
+%endfor
+    return n == ${len(exprs)} ? 0 : 1;
+}
+"""
+
+_x = sympy.symbols('x:2')
+
+
+def _mk_EvaluateCode(basedir, **attrs):
+    """ C_Code subclass (ctypes binding) whose instances (given a list of
+    expressions in ``_x``) define ``evaluate(n, x, out)``, ``attrs`` are
+    set as class attributes. """
+    import ctypes
+    import numpy as np
+    with open(os.path.join(basedir, 'evaluate_template.c'), 'wt') as ofh:
+        ofh.write(_ctypes_template)
+    dbl_arr = np.ctypeslib.ndpointer(np.float64, flags='C_CONTIGUOUS')
+
+    class EvaluateCode(C_Code):
+        templates = ['evaluate_template.c']
+        source_files = ['evaluate.c']
+        obj_files = ['evaluate.o']
+        compile_kwargs = {'std': 'c99', 'libraries': ['m']}
+        binding = 'ctypes'
+        ctypes_signatures = {
+            'evaluate': (ctypes.c_int, [ctypes.c_int, dbl_arr, dbl_arr])}
+
+        def __init__(self, exprs, **kwargs):
+            self.exprs = exprs
+            super(EvaluateCode, self).__init__(**kwargs)
+
+        def variables(self):
+            return {'exprs': [self.as_arrayified_code(
+                e, [DummyGroup('x', _x)], [ArrayifyGroup('x', 'x')])
+                for e in self.exprs]}
+
+    EvaluateCode.basedir = basedir
+    for k, v in attrs.items():
+        setattr(EvaluateCode, k, v)
+    return EvaluateCode
+
+
+def _mk_logger(name):
+    """ Logger and the list its messages are appended to. """
+    import logging
+    records = []
+
+    class Handler(logging.Handler):
+        def emit(self, record):
+            records.append(record.getMessage())
+    logger = logging.getLogger(name)
+    logger.addHandler(Handler())
+    logger.setLevel(logging.INFO)
+    return logger, records
+
+
+def test_Generic_Code_ctypes(tmpdir):
+    import ctypes
+    import numpy as np
+    tmpdir.join('evaluate_wrapper.pyx').write('raise ImportError("Unused")')
+    CtypesCode = _mk_EvaluateCode(
+        str(tmpdir), build_files=['evaluate_wrapper.pyx'],
+        source_files=['evaluate.c', 'evaluate_wrapper.pyx'],
+        obj_files=['evaluate.o', 'evaluate_wrapper.o'])
+    code = CtypesCode([_x[0]*sympy.exp(_x[1]), _x[0] - _x[1]])
+    out = np.empty(2)
+    assert code.mod.evaluate(2, np.array([2.0, 0.5]), out) == 0
+    assert np.allclose(out, [2*np.exp(0.5), 1.5])
+    with pytest.raises(ctypes.ArgumentError):
+        code.mod.evaluate(2, np.array([2, 1]), out)  # wrong dtype
+
+
+def test_Cython_Code(tmpdir, mk_ValueCode):
+    tmpdir.join('cyanswer_template.pyx').write(
+        'def answer():\n    return ${value}\n')
+
+    def mk_Code(value, **attrs):
+        attrs = dict(dict(templates=['cyanswer_template.pyx'],
+                          source_files=['cyanswer_template.pyx'],
+                          extension_name='cyanswer'), **attrs)
+        return mk_ValueCode(tmpdir, value, Cython_Code, None, **attrs)()
+
+    code = mk_Code(42)
+    assert code.mod.answer() == 42
+    assert code.so_file.startswith('cyanswer.')
+
+    # Same module name, functions may be kept
+    answer42, answer17 = code.mod.answer, mk_Code(17).mod.answer
+    assert (answer42(), answer17(), answer42()) == (42, 17, 42)
+
+    # Options of Generic_Code apply
+    tmpdir.join('support.c').write('int support(void){ return 7; }\n')
+    cache = BuildCache(str(tmpdir.join('objects')))
+    attrs = dict(build_files=['support.c'], jobs=2, obj_cache=cache,
+                 source_files=['cyanswer_template.pyx', 'support.c'])
+    codes = [mk_Code(value, **attrs) for value in (1, 2)]
+    assert [mod.answer() for mod in build_codes(codes)] == [1, 2]
+    assert cache.stats['stores'] == 1
+    code = mk_Code(3, **attrs)
+    assert code.mod.answer() == 3 and cache.stats['hits'] == 1
+    assert os.path.exists(os.path.join(code._tempdir, 'support.o'))
+
+
+def test_Interceptor(tmpdir):
+    tmpdir.join('counter_template.pyx').write(
+        'count = ${start}\ndef bump():\n    global count\n    count += 1\n')
+
+    class CounterCode(Cython_Code):
+        basedir = str(tmpdir)
+        templates = ['counter_template.pyx']
+        source_files = ['counter_template.pyx']
+        extension_name = 'counter'
+
+        def variables(self):
+            return {'start': 3}
+
+    mod = CounterCode().mod
+    assert mod.count == 3
+    mod.bump()
+    assert mod.count == 4  # variables are not cached
+    assert 'bump' in vars(mod) and 'count' not in vars(mod)
+
+
+def test_Generic_Code_compile_async(tmpdir):
+    import asyncio
+    import numpy as np
+    AsyncCode = _mk_EvaluateCode(str(tmpdir))
+    x = _x
+
+    pool = BuildPool(max_builds=1, jobs=2)
+    try:
+        code1, code2 = AsyncCode([x[0] + x[1]]), AsyncCode([x[0] - x[1]])
+        fut1 = code1.compile_async(pool)
+        fut2 = code2.compile_async(pool)
+        assert code1.compile_async(pool) is fut1
+        assert fut2.cancel()  # still queued (max_builds=1)
+        out = np.empty(1)
+        assert fut1.result().evaluate(1, np.array([3.0, 2.0]), out) == 0
+        assert out[0] == 5.0 and code1.mod is fut1.result()
+        assert code1.compile_async(pool) is fut1
+        code3 = AsyncCode([x[0]])
+        mod3 = code3.mod
+        fut3 = code3.compile_async(pool)
+        assert fut3.done() and fut3.result() is mod3 is code3.mod
+
+        async def build():
+            return await code2.compile_asyncio(pool)
+        assert asyncio.run(build()).evaluate(1, np.array([3.0, 2.0]), out) == 0
+        assert out[0] == 1.0
+    finally:
+        pool.shutdown()
+
+
+def test_build_codes(tmpdir):
+    import numpy as np
+    tmpdir.join('support.c').write('int support(void){ return 7; }\n')
+    FarmCode = _mk_EvaluateCode(
+        str(tmpdir), build_files=['support.c'],
+        source_files=['support.c', 'evaluate.c'],
+        obj_files=['support.o', 'evaluate.o'])
+    x = _x
+
+    exprs = [[x[0] + x[1]], [x[0] - x[1]], [x[0] + x[1]]]
+    codes = [FarmCode(e) for e in exprs]
+    logger, records = _mk_logger('test_build_codes')
+    mods = build_codes(codes, jobs=2, logger=logger)
+    assert records[0] == ("Building 3 instances (2 unique builds, 3 unique "
+                          "translation units, 0 cached)")
+    assert sum('Compiled' in r for r in records) == 3
+    out = np.empty(1)
+    for mod, code, ref in zip(mods, codes, [5.0, 1.0, 5.0]):
+        assert mod is code.mod
+        assert mod.evaluate(1, np.array([3.0, 2.0]), out) == 0 and out[0] == ref
+    assert mods[0].support() == 7
+
+    with pytest.raises(CompilationError):
+        build_codes([FarmCode([x[0]]), FarmCode([sympy.Symbol('y')])])
+
+
+def test_Generic_Code_unique_module_name(tmpdir, mk_ValueCode):
+    tmpdir.join('answer_template.pyx').write(
+        '# ${module_name}\ndef answer():\n    return ${value}\n')
+    registry = BuildRegistry(maxsize=1)
+
+    def mk_Code(value):
+        return mk_ValueCode(
+            tmpdir, value, template=None, templates=['answer_template.pyx'],
+            source_files=['answer.pyx'], obj_files=['answer.o'],
+            compile_kwargs={'std': 'c99'}, unique_module_name=True,
+            registry=registry)()
+
+    code42, code17 = mk_Code(42), mk_Code(17)
+    assert code42.module_name.startswith('answer_')
+    assert code42.module_name != code17.module_name
+    assert code42.module_name == mk_Code(42).module_name
+    assert os.path.exists(os.path.join(code42._tempdir, 'answer.pyx'))
+    key42 = code42.build_cache_key()  # prior to compilation
+    assert code42.mod.answer() == 42
+    assert code42.mod.__file__.endswith(code42.module_name + sharedext)
+    assert mk_Code(42).mod is code42.mod  # loaded build reused
+    assert key42 in registry
+    assert code17.mod.answer() == 17
+    assert key42 not in registry and len(registry) == 1
+    assert not os.path.exists(code42._tempdir)  # least recently used
+    assert code42.mod.answer() == 42
+
+    import numpy as np
+    tmpdir.join('element_template.pyx').write(
+        'def answer():\n    return ${values[1000]}\n')
+
+    class ElementCode(C_Code):
+        basedir = str(tmpdir)
+        templates = ['element_template.pyx']
+        source_files = ['element.pyx']
+        obj_files = ['element.o']
+        compile_kwargs = {'std': 'c99'}
+        unique_module_name = True
+        registry = BuildRegistry()
+
+        def __init__(self, values):
+            self.values = values
+            super(ElementCode, self).__init__()
+
+        def variables(self):
+            return {'values': self.values}
+
+    values = np.zeros(2000)
+    code0 = ElementCode(values.copy())
+    values[1000] = 1  # repr of values is unchanged
+    code1 = ElementCode(values)
+    assert code0.module_name != code1.module_name
+    assert code0.mod.answer() == 0 and code1.mod.answer() == 1
+
+
+def test_Generic_Code_incremental_write(tmpdir, mk_ValueCode):
+    src = tmpdir.mkdir('src')
+    src.join('support.c').write('int support(void){ return 7; }\n')
+    build = str(tmpdir.mkdir('build'))
+
+    def mk_Code(value, openmp=False, schedule='static'):
+        return mk_ValueCode(
+            src, value, template='${omp_parallel_for()}\n'
+            'double value(void){ return ${value}; }\n',
+            build_files=['support.c'], incremental_write=True,
+            openmp=openmp, omp_schedule=schedule)(tempdir=build)
+
+    support, value = [os.path.join(build, f) for f in ('support.c', 'value.c')]
+    assert sorted(mk_Code(42.0).touched_files) == [support, value]
+    mtime = os.path.getmtime(value)
+    assert mk_Code(42.0).touched_files == []
+    assert os.path.getmtime(value) == mtime
+    assert mk_Code(17.0).touched_files == [value]
+    src.join('support.c').write('int support(void){ return 8; }\n')
+    assert mk_Code(17.0).touched_files == [support]
+    assert mk_Code(17.0, openmp=True).touched_files == [value]
+    assert open(value).read().startswith('#pragma omp parallel for')
+    assert mk_Code(17.0, True, 'dynamic').touched_files == [value]
+    assert 'schedule(dynamic)' in open(value).read()
+
+
+_fingerprint_script = """
+import sympy
+from pycodeexport.codeexport import C_Code, DummyGroup, ArrayifyGroup
+
+class ModelCode(C_Code):
+    compile_kwargs = {'std': 'c99'}
+    lazy = True
+
+    def __init__(self, exprs, **kwargs):
+        self.exprs = exprs
+        self.symbols = set().union(*[e.free_symbols for e in exprs])
+        self.dummy_groups = [DummyGroup('y', sorted(self.symbols, key=str))]
+        self.arrayify_groups = [ArrayifyGroup('y', 'y')]
+        self.names = {'alpha': 1, 'beta': 2, 'gamma': 3}
+        super(ModelCode, self).__init__(**kwargs)
+
+    def variables(self):
+        return {'exprs': [self.as_arrayified_code(
+            e, self.dummy_groups, self.arrayify_groups) for e in self.exprs],
+            'scale': SCALE, 'kinds': {'real', 'complex'}}
+
+SCALE = 2.0
+a, b, c = sympy.symbols('alpha beta gamma', real=True)
+print(ModelCode([a*sympy.exp(b) + c, a - b**2]).fingerprint())
+"""
+
+
+def test_Generic_Code_fingerprint(mk_ValueCode):
+    import subprocess
+    import sys
+
+    fingerprints = set()
+    for seed in ('1', '2', '3'):
+        env = dict(os.environ, PYTHONHASHSEED=seed,
+                   PYTHONPATH=os.pathsep.join(sys.path))
+        fingerprints.add(subprocess.check_output(
+            [sys.executable, '-c', _fingerprint_script], env=env).strip())
+    assert len(fingerprints) == 1
+
+    class ModelCode(C_Code):
+        lazy = True
+
+        def __init__(self, exprs, groups, **kwargs):
+            self.exprs = exprs
+            self.groups = groups
+            super(ModelCode, self).__init__(**kwargs)
+
+    x = sympy.symbols('x:3')
+    groups = [DummyGroup('x', x), ArrayifyGroup('x', 'y', 1)]
+    exprs = [x[0]*sympy.exp(x[1]) + x[2], x[0] - x[1]**2]
+    ref = ModelCode(exprs, groups).fingerprint()
+    assert ModelCode(list(exprs), list(groups)).fingerprint() == ref
+    assert ModelCode(exprs[::-1], groups).fingerprint() != ref
+    assert ModelCode(exprs, groups[:1] + [ArrayifyGroup('x', 'y', 2)]
+                     ).fingerprint() != ref
+    assert ModelCode([exprs[0], x[0] - x[1]**3], groups).fingerprint() != ref
+    assert ModelCode(exprs, groups).fingerprint() == ref  # same session
+    assert type('ModelCode', (ModelCode,), {'compile_kwargs': {'std': 'c99'}})(
+        exprs, groups).fingerprint() != ref
+
+    def mk_Code(value):
+        return mk_ValueCode(None, value, ModelCode, None)
+
+    ref = mk_Code(42.0)(exprs, groups).fingerprint()
+    assert mk_Code(42.0)(exprs, groups).fingerprint() == ref
+    assert mk_Code(17.0)(exprs, groups).fingerprint() != ref  # closure
+
+    class Code(ModelCode):
+        def variables(self):
+            return {'value': 42.0}
+    other = Code(exprs, groups).fingerprint()
+    assert other != ref
+
+    class Code(ModelCode):
+        def variables(self):
+            return {'value': 17.0}
+    assert Code(exprs, groups).fingerprint() != other  # code
+
+
+def test_Generic_Code_timings(tmpdir):
+    x = _x
+    exprs = [x[0]*sympy.exp(x[1]), x[0] - x[1]]
+    seen = []
+    Code = _mk_EvaluateCode(str(tmpdir), phase_hooks=[
+        lambda code, phase, dt: seen.append(phase)])
+    logger, records = _mk_logger('test_Generic_Code_timings')
+    code = Code(exprs, logger=logger)
+    assert code.timings['print'].calls == 1  # once per variables()
+    assert code.timings['render'].calls == 1
+    code.mod.evaluate
+    assert list(code.timings) == ['dummify', 'print', 'arrayify', 'variables',
+                                  'render', 'compile', 'link', 'import']
+    assert seen == list(code.timings)
+    assert all(t.seconds >= 0 for t in code.timings.values())
+    assert records[-1] == code.timing_report()
+    assert records[-1].startswith('EvaluateCode timings: dummify: ')
+    code.as_arrayified_code(exprs[0], [DummyGroup('x', x)])
+    assert code.timings['dummify'].calls == 2 and len(seen) == 11
@@ -1,4 +1,11 @@
-from pycodeexport.util import defaultnamedtuple
+import os
+
+import pytest
+
+from pycodeexport.util import (
+    defaultnamedtuple, render_mako_template_to, template_cache_info,
+    clear_template_cache, render_digest_path
+)
 
 
 def test_defaultnamedtuple():
@@ -15,3 +22,87 @@ def test_defaultnamedtuple():
 
     p = Point3(3, 4, 5)
     assert p.x == 3 and p.y == 4 and p.z == 5
+
+
+def test_render_mako_template_to_cache(tmpdir):
+    clear_template_cache()
+    tmpl = tmpdir.join('foo_template.txt')
+    tmpl.write('${a}+${b}')
+    for i in range(3):
+        out = render_mako_template_to(str(tmpl), str(tmpdir.join('foo.txt')),
+                                      {'a': i, 'b': 2})
+        assert open(out).read() == '{}+2'.format(i)
+    assert template_cache_info()['misses'] == 1
+    assert template_cache_info()['hits'] == 2
+    tmpl.write('${a}-${b}-changed')  # new size => recompiled
+    render_mako_template_to(str(tmpl), str(tmpdir.join('foo.txt')),
+                            {'a': 1, 'b': 2})
+    assert open(str(tmpdir.join('foo.txt'))).read() == '1-2-changed'
+    assert template_cache_info()['misses'] == 2
+
+    moddir = tmpdir.join('modules')
+    render_mako_template_to(str(tmpl), str(tmpdir.join('foo.txt')),
+                            {'a': 1, 'b': 2}, module_directory=str(moddir))
+    assert moddir.check() and template_cache_info()['size'] == 3
+
+
+def test_render_mako_template_to_stream(tmpdir):
+    tmpl = tmpdir.join('big_template.txt')
+    tmpl.write('%for i in range(n):\n${i} ${f(i)}\n%endfor\n')
+    subsd = {'n': 1000, 'f': lambda i: i**2}
+    ref = render_mako_template_to(str(tmpl), str(tmpdir.join('ref.txt')), subsd)
+    out = render_mako_template_to(str(tmpl), str(tmpdir.join('out.txt')), subsd,
+                                  stream=True)
+    assert open(out).read() == open(ref).read()
+    assert os.stat(out).st_mode == os.stat(ref).st_mode
+
+    subsd['f'] = lambda i: 1/(i - 500)
+    with pytest.raises(ZeroDivisionError):
+        render_mako_template_to(str(tmpl), out, subsd, stream=True)
+    assert open(out).read() == open(ref).read()  # untouched on failure
+    assert sorted(os.listdir(str(tmpdir))) == ['big_template.txt', 'out.txt', 'ref.txt']
+
+    os.chmod(out, 0o640)
+    subsd['f'] = lambda i: i**3
+    render_mako_template_to(str(tmpl), out, subsd, stream=True)
+    assert os.stat(out).st_mode & 0o777 == 0o640  # mode of replaced file kept
+
+
+@pytest.mark.parametrize('stream', [False, True])
+def test_render_mako_template_to_only_update(tmpdir, stream):
+    tmpl = tmpdir.join('foo_template.txt')
+    tmpl.write('${a}+${b % 2}')
+    out = str(tmpdir.join('foo.txt'))
+
+    def render(**subsd):
+        return render_mako_template_to(str(tmpl), out, subsd, only_update=True,
+                                       stream=stream)
+
+    assert render(a=1, b=2) == out
+    os.utime(out, (0, 0))
+    assert render(a=1, b=2) is None  # skipped, same digest
+    assert render(a=1, b=4) == out  # re-rendered, same output => not written
+    assert os.path.getmtime(out) == 0
+    assert render(a=3, b=4) == out
+    assert open(out).read() == '3+0' and os.path.getmtime(out) > 0
+    assert render_digest_path(out) == str(tmpdir.join('.foo.txt.digest'))
+    assert os.path.exists(render_digest_path(out))
+
+    tmpl.write('${f(3)}')
+    assert render(f=lambda i: i+1) == out
+    assert render(f=lambda i: i*100) == out  # different code
+    assert open(out).read() == '300'
+    offset = 1
+    assert render(f=lambda i: i+offset) == out
+    assert render(f=lambda i: i+offset) is None
+    offset = 2
+    assert render(f=lambda i: i+offset) == out  # different closure
+    assert open(out).read() == '5'
+
+    import numpy as np
+    tmpl.write('${arr[1000]}')
+    arr = np.zeros(2000)
+    assert render(arr=arr.copy()) == out
+    arr[1000] = 1  # repr(arr) is unchanged
+    assert render(arr=arr) == out
+    assert open(out).read() == '1.0'
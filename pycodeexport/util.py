@@ -1,15 +1,23 @@
 # -*- coding: utf-8 -*-
 from __future__ import print_function, division, absolute_import
 
+import binascii
+import errno
+import hashlib
+import io
 import os
+import stat
+import threading
 
-from collections import namedtuple
+from collections import namedtuple, OrderedDict
 from collections.abc import Mapping
 
 from pycompilation.util import (
     md5_of_file, missing_or_other_newer, get_abspath, make_dirs
 )
 
+from .cache import stable_digest
+
 try:
     FileNotFoundError
 except NameError:
@@ -17,21 +25,171 @@ except NameError:
         pass  # Python 2
 
 
+# Process wide cache of compiled mako templates
+_template_cache = OrderedDict()
+_template_cache_lock = threading.Lock()
+_template_cache_stats = {'hits': 0, 'misses': 0}
+template_cache_maxsize = 128
+
+
+def template_cache_info():
+    """ Statistics of the compiled template cache (a dict). """
+    with _template_cache_lock:
+        return dict(_template_cache_stats, size=len(_template_cache),
+                    maxsize=template_cache_maxsize)
+
+
+def clear_template_cache():
+    """ Empties the compiled template cache and resets statistics. """
+    with _template_cache_lock:
+        _template_cache.clear()
+        _template_cache_stats.update(hits=0, misses=0)
+
+
+def get_template(template, **kwargs):
+    """ Returns a (cached) compiled ``mako.template.Template``.
+
+    Parameters
+    ----------
+    template : str or file like object
+        Path to template or file like object with template.
+    **kwargs : dict
+        Keyword arguments passed onto ``mako.template.Template``.
+        If ``module_directory`` is given (default: environment variable
+        ``PYCODEEXPORT_MAKO_MODULE_DIR``) and ``template`` is a path,
+        mako stores the compiled module on disk (so that other processes
+        need not recompile the template).
+
+    Notes
+    -----
+    Templates given as paths are cached by (absolute path, mtime, size,
+    kwargs), those given as file like objects by a hash of their content.
+    """
+    from mako.template import Template
+    module_directory = kwargs.get('module_directory', os.environ.get(
+        'PYCODEEXPORT_MAKO_MODULE_DIR'))
+    if module_directory:
+        kwargs['module_directory'] = module_directory
+    kwargs_key = tuple(sorted((k, repr(v)) for k, v in kwargs.items()))
+    if hasattr(template, 'read'):
+        template_str = template.read()
+        key = (hashlib.md5(template_str.encode('utf-8')).hexdigest(),
+               kwargs_key)
+    else:
+        path = os.path.abspath(template)
+        st = os.stat(path)
+        key = (path, st.st_mtime_ns, st.st_size, kwargs_key)
+    with _template_cache_lock:
+        if key in _template_cache:
+            _template_cache.move_to_end(key)
+            _template_cache_stats['hits'] += 1
+            return _template_cache[key]
+        _template_cache_stats['misses'] += 1
+    if hasattr(template, 'read'):
+        kwargs.pop('module_directory', None)  # only for files
+        tmpl = Template(template_str, **kwargs)
+    elif module_directory:
+        tmpl = Template(filename=path, **kwargs)
+    else:
+        with open(path, 'rt') as ifh:
+            tmpl = Template(ifh.read(), **kwargs)
+    with _template_cache_lock:
+        _template_cache[key] = tmpl
+        while len(_template_cache) > template_cache_maxsize:
+            _template_cache.popitem(last=False)
+    return tmpl
+
+
+def render_digest_path(outpath):
+    """ Path of sidecar file used by ``render_mako_template_to``. """
+    head, tail = os.path.split(outpath)
+    return os.path.join(head, '.' + tail + '.digest')
+
+
+def _render_digest(template, subsd, kwargs):
+    # structural (repr truncates e.g. large NumPy arrays, see stable_digest)
+    return stable_digest(md5_of_file(template).digest(), subsd, kwargs)
+
+
+def _file_equals(path, content):
+    if not os.path.exists(path) or os.path.getsize(path) != len(content):
+        return False
+    with open(path, 'rb') as ifh:
+        return ifh.read() == content
+
+
+def _mksibling(outpath):
+    # Unlike tempfile.mkstemp (mode 0o600) the file gets the mode of outpath
+    # if it exists and 0o666 less the (current) umask otherwise.
+    head, tail = os.path.split(outpath)
+    while True:
+        path = os.path.join(head, '.{0}.{1}'.format(
+            tail, binascii.hexlify(os.urandom(4)).decode('ascii')))
+        try:
+            fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o666)
+        except OSError as exc:
+            if exc.errno == errno.EEXIST:
+                continue
+            raise
+        try:
+            os.chmod(path, stat.S_IMODE(os.stat(outpath).st_mode))
+        except OSError:
+            pass  # new file
+        return fd, path
+
+
+def _render_to_file(tmpl, outpath, subsd, encoding, only_if_changed=False):
+    """ Renders into a temporary file in the same directory (no partial
+    output is left at outpath on failure) which is then renamed (unless
+    ``only_if_changed`` and outpath has identical content). """
+    from mako.runtime import Context
+    fd, tmppath = _mksibling(outpath)
+    try:
+        with io.open(fd, 'wt', encoding=encoding, newline='') as ofh:
+            tmpl.render_context(Context(ofh, **subsd))
+        if only_if_changed and os.path.exists(outpath) and (
+                md5_of_file(tmppath).digest() == md5_of_file(outpath).digest()):
+            os.unlink(tmppath)
+            return
+        os.replace(tmppath, outpath)
+    except BaseException:
+        if os.path.exists(tmppath):
+            os.unlink(tmppath)
+        raise
+
+
 def render_mako_template_to(
         template, outpath, subsd, only_update=False, cwd=None,
         prev_subsd=None, create_dest_dirs=False, logger=None,
-        pass_warn_string=True, **kwargs):
+        pass_warn_string=True, stream=False, **kwargs):
     """
     template: either string of path or file like obj.
 
-    Beware of the only_update option, it pays no attention to
-    an updated subsd.
+    only_update: default False
+    if True and prev_subsd is given: skip rendering when prev_subsd
+    equals subsd and outpath is newer than template.
+    if True and prev_subsd is None (template given as path): a digest
+    of template content, subsd and kwargs is stored in a sidecar file
+    (see ``render_digest_path``) and rendering is skipped when it is
+    unchanged (functions in subsd are digested by their code, closures
+    and referenced globals, see ``cache.stable_digest``, bound methods
+    also by the state of their instance). When rendering output
+    identical to the existing file it is not rewritten either, i.e.
+    the mtime of outpath is preserved
+    (which lets e.g. ``compile_sources(..., only_update=True)`` skip
+    recompilation).
 
     pass_warn_string: defult True
     if True or instance of str:
     an extra vairable named '_warning_in_the_generated_file_not_to_edit'
     is passed with a preset (True) or string warning not to
     directly edit the generated file.
+
+    stream: default False
+    if True the template is rendered directly into (a temporary file
+    which is renamed to) outpath instead of first rendering the whole
+    output in memory. Peak memory usage is then independent of the
+    size of the generated file.
     """
     if cwd:
         template = os.path.join(cwd, template)
@@ -55,7 +213,18 @@ def render_mako_template_to(
         subsd['_warning_in_the_generated_file_not_to_edit'] =\
             pass_warn_string
 
-    if only_update:
+    digest = None
+    if only_update and prev_subsd is None and not hasattr(template, 'read'):
+        digest = _render_digest(template, subsd, kwargs)
+        digest_path = render_digest_path(outpath)
+        if os.path.exists(outpath) and os.path.exists(digest_path):
+            with open(digest_path, 'rt') as ifh:
+                if ifh.read() == digest:
+                    if logger:
+                        msg = "Did not re-render {}. (same digest)"
+                        logger.info(msg.format(template))
+                    return
+    elif only_update:
         if prev_subsd == subsd and not \
            missing_or_other_newer(outpath, template):
             if logger:
@@ -63,34 +232,33 @@ def render_mako_template_to(
                 logger.info(msg.format(template))
             return
 
-    if hasattr(template, 'read'):
-        # set in-file handle to provided template
-        ifh = template
-    else:
-        # Assume template is a string of the path to the template
-        ifh = open(template, 'rt')
-
-    template_str = ifh.read()
-
     kwargs_Template = {'input_encoding': 'utf-8', 'output_encoding': 'utf-8'}
     kwargs_Template.update(kwargs)
-    with open(outpath, 'wb') as ofh:
-        from mako.template import Template
-        from mako.exceptions import text_error_template
-        try:
-            rendered = Template(
-                template_str, **kwargs_Template).render(**subsd)
-        except:
-            if logger:
-                logger.error(text_error_template().render())
-            else:
-                print(text_error_template().render())
-            raise
+    from mako.exceptions import text_error_template
+    try:
+        tmpl = get_template(template, **kwargs_Template)
         if logger:
             logger.info("Rendering '{}' to '{}'...".format(
-                ifh.name, outpath))
-        ofh.write(rendered)
-    ifh.close()
+                getattr(template, 'name', template), outpath))
+        if stream:
+            _render_to_file(tmpl, outpath, subsd, encoding=kwargs_Template[
+                'output_encoding'] or 'utf-8', only_if_changed=bool(digest))
+        else:
+            rendered = tmpl.render(**subsd)
+            if not (digest and _file_equals(outpath, rendered)):
+                with open(outpath, 'wb') as ofh:
+                    ofh.write(rendered)
+    except:
+        if logger:
+            logger.error(text_error_template().render())
+        else:
+            print(text_error_template().render())
+        raise
+    if hasattr(template, 'read'):
+        template.close()
+    if digest:
+        with open(render_digest_path(outpath), 'wt') as ofh:
+            ofh.write(digest)
     return outpath
 
 